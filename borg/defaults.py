@@ -5,6 +5,9 @@ import os
 machine_speed = 1.0
 proc_poll_period = 1.0
 root_log_level = os.environ.get("BORG_LOG_ROOT_LEVEL", "NOTSET")
+array_cache_path = os.environ.get("BORG_ARRAY_CACHE")
+array_cache_bytes = int(os.environ.get("BORG_ARRAY_CACHE_BYTES", 2**30))
+em_checkpoint_interval = 60.0
 
 try:
     from borg_site_defaults import *
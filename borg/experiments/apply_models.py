@@ -2,7 +2,6 @@
 
 import os.path
 import csv
-import copy
 import numpy
 import condor
 import borg
@@ -13,11 +12,7 @@ def infer_distributions(run_data, model_name, instance, exclude):
     """Compute model predictions on every instance."""
 
     # customize the run data
-    filtered_data = copy.deepcopy(run_data)
-
-    filtered_runs = filter(lambda r: r.solver != exclude, filtered_data.run_lists[instance])
-
-    filtered_data.run_lists[instance] = filtered_runs
+    filtered_data = run_data.excluding(instance, exclude)
 
     # sample from the model posterior
     model = borg.experiments.common.train_model(model_name, filtered_data, bins = 8)
@@ -10,36 +10,48 @@ import borg
 
 logger = borg.get_logger(__name__, default_level = "INFO")
 
-def evaluate_split(run_data, model_name, K, split, train_mask, test_mask):
-    """Evaluate a model on a train/test split."""
+def evaluate_split(run_data, model_name, Ks, split, train_mask, test_mask):
+    """
+    Evaluate a model on a train/test split, over increasing K.
+
+    Each fit is warm-started from the fit at the previous K, so the Ks given
+    to one job run in sequence; callers trade that reuse against parallelism
+    by choosing how many Ks each job covers.
+    """
 
     training = run_data.masked(train_mask).collect_systematic([4])
     testing = run_data.masked(test_mask).collect_systematic([4])
-
-    # build the model
-    if model_name == "mul-dirmix":
-        estimator = borg.models.MulDirMixEstimator(K = K, samples_per = 128)
-    elif model_name == "mul-dirmatmix":
-        estimator = borg.models.MulDirMatMixEstimator(K = K)
-    else:
-        raise ValueError("unrecognized model name {0}".format(model_name))
-
-    bins = 10
-    model = estimator(training, bins, training)
-
-    # evaluate the model
-    score = numpy.mean(borg.models.run_data_log_probabilities(model, testing))
-
-    logger.info(
-        "%s score at K = %i given %i runs from %i instances: %f",
-        model_name,
-        K,
-        training.get_run_count(),
-        len(training),
-        score,
-        )
-
-    return [model_name, K, len(training), split, score]
+    rows = []
+    fit = None
+
+    for K in Ks:
+        # build the model, warm-started from the fit at the previous K
+        if model_name == "mul-dirmix":
+            estimator = borg.models.MulDirMixEstimator(K = K, samples_per = 128, initial = fit)
+        elif model_name == "mul-dirmatmix":
+            estimator = borg.models.MulDirMatMixEstimator(K = K, initial = fit)
+        else:
+            raise ValueError("unrecognized model name {0}".format(model_name))
+
+        bins = 10
+        model = estimator(training, bins, training)
+        fit = estimator.fit
+
+        # evaluate the model
+        score = numpy.mean(borg.models.run_data_log_probabilities(model, testing))
+
+        logger.info(
+            "%s score at K = %i given %i runs from %i instances: %f",
+            model_name,
+            K,
+            training.get_run_count(),
+            len(training),
+            score,
+            )
+
+        rows.append([model_name, K, len(training), split, score])
+
+    return rows
 
 @borg.annotations(
     out_path = ("results output path"),
@@ -58,17 +70,18 @@ def main(out_path, bundle, workers = 0, local = False):
             split = uuid.uuid4()
             Ks = range(1, 64, 1)
 
-            for K in Ks:
-                for model_name in ["mul-dirmix", "mul-dirmatmix"]:
-                    yield (evaluate_split, [run_data, model_name, K, split, train_mask, test_mask])
+            for model_name in ["mul-dirmix", "mul-dirmatmix"]:
+                # warm starts chain only within each chunk of Ks
+                for begin in xrange(0, len(Ks), 8):
+                    yield (evaluate_split, [run_data, model_name, Ks[begin:begin + 8], split, train_mask, test_mask])
 
     with open(out_path, "w") as out_file:
         writer = csv.writer(out_file)
 
         writer.writerow(["model_name", "components", "instances", "split", "mean_log_probability"])
 
-        for (_, row) in condor.do(yield_jobs(), workers, local):
-            writer.writerow(row)
+        for (_, rows) in condor.do(yield_jobs(), workers, local):
+            writer.writerows(rows)
 
             out_file.flush()
 
@@ -1,7 +1,6 @@
 """@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
 
 import contextlib
-import numpy
 import borg
 
 logger = borg.get_logger(__name__, default_level = "DETAIL")
@@ -84,14 +83,11 @@ class FakeSolverFactory(object):
     def start(self, task):
         """Return a fake solver process."""
 
-        all_runs = self._runs_data.run_lists[task]
-        our_runs = filter(lambda run: run.solver == self._solver_name, all_runs)
+        run = self._runs_data.sample_run_on(task, self._solver_name)
 
-        if len(our_runs) == 0:
+        if run is None:
             raise Exception("no runs of solver \"{0}\" are recorded".format(self._solver_name))
 
-        run = our_runs[numpy.random.randint(len(our_runs))]
-
         return FakeSolverProcess(run)
 
 class FakeDomain(object):
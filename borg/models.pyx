@@ -1,7 +1,9 @@
 #cython: profile=False
 """@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
 
+import multiprocessing.pool
 import numpy
+import scipy.special
 import borg
 
 cimport cython
@@ -14,46 +16,97 @@ logger = borg.get_logger(__name__, default_level = "DEBUG")
 cdef extern from "math.h":
     double INFINITY
 
-@cython.infer_types(True)
+def multinomial_log_coefficients(counts):
+    """Compute the log multinomial coefficient of each (M, S, C) count matrix."""
+
+    counts_MSC = numpy.asarray(counts, numpy.double)
+
+    return \
+        numpy.sum(
+            scipy.special.gammaln(1.0 + numpy.sum(counts_MSC, axis = -1))
+            - numpy.sum(scipy.special.gammaln(1.0 + counts_MSC), axis = -1),
+            axis = -1,
+            )
+
+def _pmfs_log_pmf_block(pmfs_BX, counts_MX, coefficients_M):
+    """Compute the (B, M) log probabilities of counts under flattened log PMFs."""
+
+    impossible_BX = numpy.isneginf(pmfs_BX)
+
+    if numpy.any(impossible_BX):
+        # zero counts of impossible outcomes must not contribute NaNs
+        logs_BM = numpy.dot(numpy.where(impossible_BX, 0.0, pmfs_BX), counts_MX.T)
+        logs_BM[numpy.dot(impossible_BX, counts_MX.T) > 0.0] = -INFINITY
+    else:
+        logs_BM = numpy.dot(pmfs_BX, counts_MX.T)
+
+    logs_BM += coefficients_M[None, :]
+
+    return logs_BM
+
 def sampled_pmfs_log_pmf(pmfs, counts):
     """Compute the log probabilities of instance runs given discrete log PMFs."""
 
     borg.statistics.assert_log_weights(pmfs, axis = -1)
 
-    cdef int N = pmfs.shape[0]
-    cdef int S = pmfs.shape[1]
-    cdef int C = pmfs.shape[2]
-    cdef int M = counts.shape[0]
+    (N, S, C) = pmfs.shape
+    M = counts.shape[0]
 
-    cdef numpy.ndarray[double, ndim = 3] pmfs_NSC = pmfs
-    cdef numpy.ndarray[int, ndim = 3] counts_MSC = counts
-    cdef numpy.ndarray[double, ndim = 2] logs_NM = numpy.empty((N, M), numpy.double)
+    logs_NM = \
+        _pmfs_log_pmf_block(
+            numpy.reshape(pmfs, (N, S * C)),
+            numpy.reshape(counts, (M, S * C)).astype(numpy.double),
+            multinomial_log_coefficients(counts),
+            )
 
-    cdef int counts_msc
+    borg.statistics.assert_log_probabilities(logs_NM)
 
-    for n in xrange(N):
-        for m in xrange(M):
-            logs_NM[n, m] = 0.0
+    return logs_NM
 
-            for s in xrange(S):
-                sum_counts_ms = 0
+def sampled_pmfs_mixture_log_pmf(pmfs, counts, log_weights, block = 1024, threads = 1):
+    """
+    Compute the log probabilities of instance runs under a mixture of log PMFs.
 
-                for c in xrange(C):
-                    counts_msc = counts_MSC[m, s, c]
+    The (N, M) log weights may also be a vector shared by every instance.
+    Samples are scored in blocks, in parallel, without materializing the
+    full (N, M) log probability matrix.
+    """
 
-                    if counts_msc > 0:
-                        sum_counts_ms += counts_msc
+    borg.statistics.assert_log_weights(pmfs, axis = -1)
 
-                        logs_NM[n, m] += counts_msc * pmfs_NSC[n, s, c]
-                        logs_NM[n, m] -= libc.math.lgamma(1.0 + counts_msc)
+    (N, S, C) = pmfs.shape
+    M = counts.shape[0]
 
-                logs_NM[n, m] += libc.math.lgamma(1.0 + sum_counts_ms)
+    pmfs_NX = numpy.reshape(pmfs, (N, S * C))
+    counts_MX = numpy.reshape(counts, (M, S * C)).astype(numpy.double)
+    coefficients_M = multinomial_log_coefficients(counts)
+    log_weights = numpy.asarray(log_weights)
 
-    borg.statistics.assert_log_probabilities(logs_NM)
+    if log_weights.ndim == 1:
+        log_weights = log_weights[:, None]
 
-    return logs_NM
+    def score_block(begin):
+        end = min(begin + block, N)
+        logs_BM = _pmfs_log_pmf_block(pmfs_NX[begin:end], counts_MX, coefficients_M)
+        logs_BM += log_weights[begin:end]
+
+        return borg.statistics.logsumexp(logs_BM, axis = 0)
+
+    begins = xrange(0, N, block)
+
+    if threads > 1:
+        pool = multiprocessing.pool.ThreadPool(threads)
+
+        try:
+            partials = pool.map(score_block, begins)
+        finally:
+            pool.terminate()
+    else:
+        partials = map(score_block, begins)
+
+    return borg.statistics.logsumexp(partials, axis = 0)
 
-def run_data_log_probabilities(model, testing, weights = None):
+def run_data_log_probabilities(model, testing, weights = None, threads = 1):
     """Compute per-instance log probabilities of run data under a model."""
 
     logger.info("scoring model on %i instances", len(testing))
@@ -62,19 +115,17 @@ def run_data_log_probabilities(model, testing, weights = None):
     B = C - 1
 
     counts = testing.to_bins_array(testing.solver_names, B)
-    log_probabilities = borg.models.sampled_pmfs_log_pmf(model.log_masses, counts)
 
     if weights is None:
-        weights = numpy.ones_like(log_probabilities.T) / log_probabilities.shape[0]
+        log_weights = numpy.zeros(N) - numpy.log(N)
+    else:
+        borg.statistics.assert_weights(weights, axis = -1)
 
-    borg.statistics.assert_weights(weights, axis = -1)
+        assert weights.shape == (counts.shape[0], N)
 
-    assert weights.T.shape == log_probabilities.shape
+        log_weights = numpy.log(weights.T)
 
-    weighted_lps = log_probabilities + numpy.log(weights.T)
-    lps_per = numpy.logaddexp.reduce(weighted_lps, axis = 0)
-
-    return lps_per
+    return sampled_pmfs_mixture_log_pmf(model.log_masses, counts, log_weights, threads = threads)
 
 class MultinomialModel(object):
     """Multinomial mixture model."""
@@ -137,10 +188,64 @@ class MultinomialModel(object):
         for (s, b) in failures:
             log_post_weights_N += self._log_survival_NSC[:, s, b]
 
-        log_post_weights_N -= numpy.logaddexp.reduce(log_post_weights_N)
+        log_post_weights_N -= borg.statistics.logsumexp(log_post_weights_N)
 
         return MultinomialModel(self._interval, self._log_survival_NSC, log_post_weights_N)
 
+    def condition_weights(self, log_weights, s, b):
+        """Condition posterior log weights on one more failure, in place."""
+
+        log_weights += self._log_survival_NSC[:, s, b]
+        log_weights -= borg.statistics.logsumexp(log_weights)
+
+        return log_weights
+
+    def compacted(self, threshold = 1e-4):
+        """
+        Return an equivalent model without its lightest components.
+
+        The lightest components, with at most the given total posterior mass,
+        are dropped and the remaining weights renormalized. Returns the new
+        model and a bound on its KL divergence from this one.
+        """
+
+        order_N = numpy.argsort(self._log_weights_N)
+        dropped_N = numpy.exp(borg.statistics.logcumsumexp(self._log_weights_N[order_N])) <= threshold
+        dropped_N[-1] = False
+        kept_N = numpy.sort(order_N[~dropped_N])
+
+        if numpy.any(dropped_N):
+            dropped_mass = numpy.exp(borg.statistics.logsumexp(self._log_weights_N[order_N[dropped_N]]))
+        else:
+            dropped_mass = 0.0
+
+        log_weights_N = self._log_weights_N[kept_N]
+        log_weights_N -= borg.statistics.logsumexp(log_weights_N)
+
+        def subset(array):
+            return None if array is None else array[kept_N]
+
+        model = \
+            MultinomialModel(
+                self._interval,
+                self._log_survival_NSC[kept_N],
+                log_weights = log_weights_N,
+                log_masses = subset(self._log_masses_NSC),
+                names = subset(self._names),
+                features = subset(self._features),
+                )
+
+        kl_bound = -numpy.log1p(-dropped_mass)
+
+        logger.info(
+            "compacted model from %i to %i components (KL bound %.2e)",
+            self._log_weights_N.shape[0],
+            kept_N.shape[0],
+            kl_bound,
+            )
+
+        return (model, kl_bound)
+
     @property
     def interval(self):
         """The associated discretization interval."""
@@ -225,10 +330,13 @@ class MulDirEstimator(object):
                 )
 
 class MulDirMixEstimator(object):
-    def __init__(self, K = 4, alpha = None, samples_per = 64):
+    def __init__(self, K = 4, alpha = None, samples_per = 64, threads = 1, initial = None):
         self._K = K
         self._alpha = alpha
         self._samples_per = samples_per
+        self._threads = threads
+        self._initial = initial
+        self.fit = None
 
     def __call__(self, run_data, bins, full_data):
         # ...
@@ -245,6 +353,11 @@ class MulDirMixEstimator(object):
         alphas_KSD = numpy.empty((K, S, D), numpy.double)
         log_responsibilities_KSN = numpy.empty((K, S, N), numpy.double)
 
+        if self._initial is None:
+            initial_S = [None] * S
+        else:
+            initial_S = [(self._initial[0][:, s], self._initial[1][:, s]) for s in xrange(S)]
+
         for s in xrange(S):
             logger.info(">>>> ESTIMATING RTDS FOR SOLVER %i", s)
 
@@ -252,28 +365,34 @@ class MulDirMixEstimator(object):
                 alphas_KSD[:, s, :],
                 log_responsibilities_KSN[:, s, :],
                 ) = \
-                borg.statistics.dcm_mixture_estimate_ml(counts_NSD[:, s, :], K, self._alpha)
+                borg.statistics.dcm_mixture_estimate_ml(
+                    counts_NSD[:, s, :],
+                    K,
+                    self._alpha,
+                    threads = self._threads,
+                    initial = initial_S[s],
+                    )
+
+        self.fit = (alphas_KSD, log_responsibilities_KSN)
 
         # sample individual distributions
         logger.info("sampling %i RTD sets under dirmix", T)
 
-        samples_TSD = numpy.empty((T, S, D), numpy.double)
-        features_TF = numpy.empty((T, F), numpy.double)
-        names_N = sorted(run_data.ids)
-        names_T = numpy.empty(T, object)
-
-        for t in xrange(T):
-            n = t % N
-
-            features_TF[t, :] = features_NF[n, :]
-            names_T[t] = names_N[n]
+        # draw a component for each sample and solver, in (t, s) order
+        log_responsibilities_NSK = log_responsibilities_KSN.transpose(2, 1, 0).reshape((N * S, K))
+        components_TS = numpy.empty((T, S), numpy.intc)
 
-            for s in xrange(S):
-                k = borg.statistics.categorical_rv_log(log_responsibilities_KSN[:, s, n])
+        for r in xrange(self._samples_per):
+            components_TS[r * N:(r + 1) * N] = \
+                borg.statistics \
+                    .categorical_rvs_log(log_responsibilities_NSK) \
+                    .reshape((N, S))
 
-                #samples_TSD[t, s, :] = alphas_KSD[k, s, :] + counts_NSD[n, s, :] + 1e-1
-                samples_TSD[t, s, :] = alphas_KSD[k, s, :] + counts_NSD[n, s, :] + 1e-2
-                samples_TSD[t, s, :] /= numpy.sum(samples_TSD[t, s, :])
+        samples_TSD = alphas_KSD[components_TS, numpy.arange(S)] + numpy.tile(counts_NSD, (self._samples_per, 1, 1))
+        samples_TSD += 1e-2
+        samples_TSD /= numpy.sum(samples_TSD, axis = -1)[..., None]
+        features_TF = numpy.tile(numpy.asarray(features_NF, numpy.double), (self._samples_per, 1))
+        names_T = numpy.tile(numpy.array(sorted(run_data.ids), object), self._samples_per)
 
         assert numpy.all(samples_TSD >= 0.0)
 
@@ -287,9 +406,24 @@ class MulDirMixEstimator(object):
                 )
 
 class MulDirMatMixEstimator(object):
-    def __init__(self, K = 32, alpha = None):
+    def __init__(
+        self,
+        K = 32,
+        alpha = None,
+        threads = 1,
+        initial = None,
+        checkpoint_path = None,
+        batch_size = None,
+        step_decay = 0.6,
+        ):
         self._K = K
         self._alpha = alpha
+        self._threads = threads
+        self._initial = initial
+        self._checkpoint_path = checkpoint_path
+        self._batch_size = batch_size
+        self._step_decay = step_decay
+        self.fit = None
 
     def __call__(self, run_data, bins, full_data):
         # ...
@@ -304,17 +438,23 @@ class MulDirMatMixEstimator(object):
 
         # fit model
         (alphas_KSD, log_responsibilities_KN) = \
-            borg.statistics.dcm_matrix_mixture_estimate_ml(counts_NSD, K, self._alpha)
+            borg.statistics.dcm_matrix_mixture_estimate_ml(
+                counts_NSD,
+                K,
+                self._alpha,
+                threads = self._threads,
+                initial = self._initial,
+                checkpoint_path = self._checkpoint_path,
+                batch_size = self._batch_size,
+                step_decay = self._step_decay,
+                )
+
+        self.fit = (alphas_KSD, log_responsibilities_KN)
 
         # extract RTD samples
         T = N * K
         #T = N
         #T = K
-        samples_TSD = numpy.empty((T, S, D), numpy.double)
-        log_weights_T = numpy.empty(T, numpy.double)
-        features_TF = numpy.empty((T, F), numpy.double)
-        names_N = sorted(run_data.ids)
-        names_T = numpy.empty(T, object)
 
         #samples_TSD = alphas_KSD / numpy.sum(alphas_KSD, axis = -1)[..., None] # XXX
         #log_weights_T = numpy.logaddexp.reduce(log_responsibilities_KN, axis = -1) - numpy.log(N)
@@ -342,66 +482,15 @@ class MulDirMatMixEstimator(object):
                 ##features = features_TF,
                 #)
 
-        for n in xrange(N):
-            #t = n
-            #k = borg.statistics.categorical_rv_log(log_responsibilities_KN[:, n])
-            #k = numpy.argmax(log_responsibilities_KN[:, n])
-
-            #log_weights_T[t] = -numpy.log(T)
-
-            #map_KSD = alphas_KSD + counts_NSD[None, n]
-            #map_KSD /= numpy.sum(map_KSD, axis = -1)[..., None]
-            #map_KSD *= numpy.exp(log_responsibilities_KN[:, n])[..., None, None]
-            #map_SD = numpy.sum(map_KSD, axis = 0)
-
-            ##map_SD = alphas_KSD[k]
-            ##map_SD /= numpy.sum(map_SD, axis = -1)[..., None]
-
-            #for s in xrange(S):
-                ##samples_TSD[t, s, :] = 0.0
-                ##samples_TSD[t, s, numpy.argmax(map_SD[s, :])] = 1.0
-                #samples_TSD[t, s, :] = map_SD[s, :]
-
-                #borg.statistics.assert_weights(samples_TSD[t, s, :], axis = -1)
-
-            #features_TF[t, :] = features_NF[n, :]
-
-            #with borg.util.numpy_printing(precision = 2, suppress = True, linewidth = 200, threshold = 1000000):
-                #print "# t =", t, "n =", n
-                #print counts_NSD[n]
-                #print full_NSD[sorted(full_data.ids).index(sorted(run_data.ids)[n])]
-                #print samples_TSD[t]
-
-            for k in xrange(K):
-                t = n * K + k
-
-                log_weights_T[t] = log_responsibilities_KN[k, n] - numpy.log(N)
-                features_TF[t, :] = features_NF[n, :]
-                names_T[t] = names_N[n]
-
-                for s in xrange(S):
-                    samples_TSD[t, s, :] = alphas_KSD[k, s, :] + counts_NSD[n, s, :] + 1e-2
-                    samples_TSD[t, s, :] /= numpy.sum(samples_TSD[t, s, :])
-                    #samples_TSD[t, s, :] = 0.0
-                    #samples_TSD[t, s, numpy.argmax(alphas_KSD[k, s, :])] = 1.0
-
-                    #thetas = alphas_KSD[:, s, :] + counts_NSD[n, s, :]
-                    #thetas *= numpy.exp(log_responsibilities_KN[:, n])[..., None]
+        samples_NKSD = alphas_KSD[None, ...] + counts_NSD[:, None, ...]
+        samples_NKSD += 1e-2
+        samples_NKSD /= numpy.sum(samples_NKSD, axis = -1)[..., None]
+        samples_TSD = samples_NKSD.reshape((T, S, D))
+        log_weights_T = (log_responsibilities_KN.T - numpy.log(N)).reshape(T)
+        features_TF = numpy.repeat(numpy.asarray(features_NF, numpy.double), K, axis = 0)
+        names_T = numpy.repeat(numpy.array(sorted(run_data.ids), object), K)
 
-                    #samples_NSD[n, s, :] = numpy.sum(thetas, axis = 0)
-                    #samples_NSD[n, s, :] /= numpy.sum(samples_NSD[n, s, :])
-
-                    borg.statistics.assert_weights(samples_TSD[t, s, :], axis = -1)
-
-                #if numpy.exp(log_responsibilities_KN[k, n]) > 1e-1:
-                    #with borg.util.numpy_printing(precision = 2, suppress = True, linewidth = 200, threshold = 1000000):
-                        #print "# t =", t, "n =", n, "k =", k, "({0})".format(numpy.exp(log_responsibilities_KN[k, n]))
-                        #print counts_NSD[n]
-                        #print full_NSD[sorted(full_data.ids).index(sorted(run_data.ids)[n])]
-                        #print alphas_KSD[k]
-                        #print samples_TSD[t]
-
-        #raise SystemExit()
+        borg.statistics.assert_weights(samples_TSD, axis = -1)
 
         assert numpy.all(samples_TSD >= 0.0)
 
@@ -276,7 +276,7 @@ class ReorderingPlanner(Planner):
 
         def compute_plan(log_survival_WSB, log_weights_W):
             plan = inner_planner.plan(log_survival_WSB, log_weights_W)
-            log_mean_fail_cmf_SB = numpy.logaddexp.reduce(log_survival_WSB + log_weights_W[:, None, None], axis = 0)
+            log_mean_fail_cmf_SB = borg.statistics.weighted_logsumexp(log_survival_WSB, log_weights_W)
 
             def efficiency(pair):
                 (s, c) = pair
@@ -160,7 +160,10 @@ class PreplanningPortfolio(object):
 class PureModelPortfolio(object):
     """Hybrid mixture-model portfolio."""
 
-    def __init__(self, suite, model, regress = None, planner = borg.planners.default):
+    # portfolios pickled before compaction existed lack this attribute
+    _compact = None
+
+    def __init__(self, suite, model, regress = None, planner = borg.planners.default, compact = None):
         """Initialize."""
 
         self._model = model
@@ -168,6 +171,19 @@ class PureModelPortfolio(object):
         self._planner = planner
         self._solver_names = sorted(suite.solvers)
         self._runs_limit = 256
+        self._compact = None
+
+        if compact is not None:
+            self.compact(compact)
+
+    def compact(self, threshold):
+        """Drop model components with negligible posterior mass."""
+
+        if self._regress is None:
+            (self._model, _) = self._model.compacted(threshold)
+        else:
+            # predicted weights index every component, so compact per task
+            self._compact = threshold
 
     def __call__(self, task, suite, budget):
         """Run the portfolio."""
@@ -183,9 +199,13 @@ class PureModelPortfolio(object):
                 (predicted_weights,) = numpy.log(self._regress.predict([task], [feature_values_sorted]))
                 initial_model = self._model.with_weights(predicted_weights)
 
+                if self._compact is not None:
+                    (initial_model, _) = initial_model.compacted(self._compact)
+
             # compute and execute a solver schedule
+            model = initial_model
+            log_weights = numpy.copy(model.log_weights)
             plan = []
-            failures = []
 
             for i in xrange(self._runs_limit):
                 elapsed = accountant.total.cpu_seconds
@@ -194,13 +214,12 @@ class PureModelPortfolio(object):
                     break
 
                 if len(plan) == 0:
-                    model = initial_model.condition(failures)
                     remaining = budget.cpu_seconds - elapsed
                     remaining_b = int(numpy.ceil(remaining / model.interval))
                     plan = \
                         self._planner.plan(
                             model.log_survival[..., :remaining_b],
-                            model.log_weights,
+                            log_weights,
                             )
 
                 (s, b) = plan.pop(0)
@@ -212,7 +231,7 @@ class PureModelPortfolio(object):
                 if suite.domain.is_final(task, answer):
                     return answer
                 else:
-                    failures.append((s, b))
+                    model.condition_weights(log_weights, s, b)
 
             return None
 
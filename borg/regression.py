@@ -87,9 +87,9 @@ def mapify_model_survivals(model):
 
         log_survivals = model.log_survival[mask]
         log_weights = model.log_weights[mask]
-        log_weights -= numpy.logaddexp.reduce(log_weights)
+        log_weights -= borg.statistics.logsumexp(log_weights)
 
-        map_survivals[n, :, :] = numpy.logaddexp.reduce(log_survivals + log_weights[:, None, None])
+        map_survivals[n, :, :] = borg.statistics.weighted_logsumexp(log_survivals, log_weights)
 
     return (unique_names, masks, features, numpy.exp(map_survivals))
 
@@ -2,17 +2,37 @@
 
 cimport libc.math
 
+from libc.stdint cimport uint64_t
+
 cdef extern from "math.h":
     double NAN
     double INFINITY
 
-cdef double log_plus(double x, double y)
-cdef double log_minus(double x, double y)
+cdef double log_plus(double x, double y) nogil
+cdef double log_minus(double x, double y) nogil
 
 cdef double log_erf_approximate(double x)
 cpdef double digamma(double x)
 cpdef double inverse_digamma(double x)
 
+ctypedef struct PRNGState:
+    uint64_t key
+    uint64_t counter
+    uint64_t spawned
+    double normal_cache
+    bint normal_cached
+
+cdef class PRNGStream:
+    cdef PRNGState state
+
+cdef void prng_seed(PRNGState* state, uint64_t seed, uint64_t stream) nogil
+cdef uint64_t prng_bits(PRNGState* state) nogil
+cdef double prng_uniform(PRNGState* state) nogil
+cdef double prng_normal(PRNGState* state) nogil
+cdef double prng_gamma(PRNGState* state, double shape) nogil
+cdef int prng_categorical(PRNGState* state, int D, double* ps, int ps_stride) nogil
+cdef int prng_categorical_log(PRNGState* state, int D, double* logps, int logps_stride) nogil
+
 cdef int categorical_rv_raw(int D, double* logps, int logps_stride)
 cdef int categorical_rv_log_raw(int D, double* logps, int logps_stride)
 
@@ -27,7 +47,7 @@ cdef int post_dirichlet_rv(
     ) except -1
 
 cdef double standard_normal_log_pdf(double x)
-cdef double standard_normal_log_cdf(double x)
+cdef double standard_normal_log_cdf(double x) nogil
 
 cdef double normal_log_pdf(double mu, double sigma, double x)
 cdef double normal_log_cdf(double mu, double sigma, double x)
@@ -36,7 +56,7 @@ cdef double truncated_normal_log_pdf(double a, double b, double mu, double sigma
 cdef double truncated_normal_log_cdf(double a, double b, double mu, double sigma, double x)
 
 cdef double log_normal_log_pdf(double mu, double sigma, double theta, double x)
-cdef double log_normal_log_cdf(double mu, double sigma, double theta, double x)
+cdef double log_normal_log_cdf(double mu, double sigma, double theta, double x) nogil
 
 cdef double binomial_log_pmf(double p, int N, int n)
 
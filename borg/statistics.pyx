@@ -1,8 +1,13 @@
 #cython: profile=False
 """@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
 
+import os
 import sys
+import time
 import random
+import hashlib
+import tempfile
+import cPickle as pickle
 import numpy
 import scipy.special
 import scipy.optimize
@@ -13,9 +18,13 @@ cimport libc.math
 cimport libc.limits
 cimport numpy
 
+from libc.stdint cimport uint64_t
+from cython.parallel cimport prange
+
 cdef extern from "math.h":
     double NAN
     double INFINITY
+    double lgamma_r(double x, int* sign) nogil
 
 logger = borg.get_logger(__name__, default_level = "DETAIL")
 
@@ -83,23 +92,18 @@ def set_prng_seeds(seed = None):
     Set seeds for all relevant PRNGs.
     
     The (optional) argument is to random.seed(), which is used to initialize
-    the other relevant PRNGs. That's statistically iffy, but what isn't?
+    the other relevant PRNGs, including the default PRNG stream. That's
+    statistically iffy, but what isn't?
     """
 
     random.seed(seed)
 
     numpy.random.seed(random.randint(0, sys.maxint))
 
-    ii = numpy.iinfo(numpy.int32)
-
-    _set_internal_prng_seed(
-        random.randint(ii.min, ii.max),
-        random.randint(ii.min, ii.max),
-        random.randint(ii.min, ii.max),
-        )
+    _default_stream.seed(random.getrandbits(64))
 
 @cython.profile(False)
-cdef double log_plus(double x, double y):
+cdef double log_plus(double x, double y) nogil:
     """
     Return log(x + y) given log(x) and log(y); see [1].
 
@@ -114,7 +118,7 @@ cdef double log_plus(double x, double y):
         return y + libc.math.log(1.0 + libc.math.exp(x - y))
 
 @cython.profile(False)
-cdef double log_minus(double x, double y):
+cdef double log_minus(double x, double y) nogil:
     """
     Return log(x - y) given log(x) and log(y); see [1].
 
@@ -145,6 +149,17 @@ def to_log_survival(probabilities, axis):
 
     return floored_log(1.0 - numpy.cumsum(probabilities, axis = axis))
 
+def unique_rows(array):
+    """Return the distinct rows of an array, and the index of each row among them."""
+
+    array_N_ = numpy.ascontiguousarray(array)
+    flat_NX = array_N_.reshape((array_N_.shape[0], -1))
+    rows_N = flat_NX.view(numpy.dtype((numpy.void, flat_NX.shape[1] * flat_NX.itemsize))).ravel()
+
+    (_, firsts_U, inverse_N) = numpy.unique(rows_N, return_index = True, return_inverse = True)
+
+    return (array_N_[firsts_U], inverse_N)
+
 def indicator(indices, D, dtype = numpy.intc):
     """Convert a vector of indices into a matrix of indicator vectors."""
 
@@ -157,6 +172,220 @@ def indicator(indices, D, dtype = numpy.intc):
 
     return indicator
 
+#
+# LOG-SPACE ARITHMETIC
+#
+
+@cython.cdivision(True)
+cdef void _logsumexp_rows(int R, int L, double* in_RL, double* out_R) nogil:
+    """Reduce each contiguous row of log values, shifting by its maximum."""
+
+    cdef double* row
+    cdef double maximum
+    cdef double total
+    cdef int r
+    cdef int l
+
+    for r in xrange(R):
+        row = in_RL + r * L
+        maximum = -INFINITY
+
+        for l in xrange(L):
+            if row[l] > maximum:
+                maximum = row[l]
+
+        if maximum == -INFINITY or maximum == INFINITY:
+            out_R[r] = maximum
+        else:
+            total = 0.0
+
+            for l in xrange(L):
+                total += libc.math.exp(row[l] - maximum)
+
+            out_R[r] = maximum + libc.math.log(total)
+
+@cython.cdivision(True)
+cdef void _logsumexp_columns(
+    int L,
+    int R,
+    int stride,
+    double* in_LR,
+    double* offsets_L,
+    double* maxima_R,
+    double* out_R,
+    ) nogil:
+    """Reduce R columns of log values, plus optional row offsets, one row at a time."""
+
+    cdef double* row
+    cdef double offset = 0.0
+    cdef int l
+    cdef int r
+
+    for r in xrange(R):
+        maxima_R[r] = -INFINITY
+        out_R[r] = 0.0
+
+    for l in xrange(L):
+        row = in_LR + l * stride
+
+        if offsets_L != NULL:
+            offset = offsets_L[l]
+
+        for r in xrange(R):
+            if row[r] + offset > maxima_R[r]:
+                maxima_R[r] = row[r] + offset
+
+    for l in xrange(L):
+        row = in_LR + l * stride
+
+        if offsets_L != NULL:
+            offset = offsets_L[l]
+
+        for r in xrange(R):
+            if maxima_R[r] != -INFINITY and maxima_R[r] != INFINITY:
+                out_R[r] += libc.math.exp(row[r] + offset - maxima_R[r])
+
+    for r in xrange(R):
+        if maxima_R[r] == -INFINITY or maxima_R[r] == INFINITY:
+            out_R[r] = maxima_R[r]
+        else:
+            out_R[r] = maxima_R[r] + libc.math.log(out_R[r])
+
+@cython.boundscheck(False)
+def _leading_logsumexp(array, log_offsets, int threads, int block):
+    """Reduce a contiguous array over its leading axis, in column blocks."""
+
+    cdef int L = array.shape[0]
+    cdef int R = numpy.prod(array.shape[1:])
+
+    cdef numpy.ndarray[double, ndim = 2] in_LR = array.reshape((L, R))
+    cdef numpy.ndarray[double, ndim = 1] maxima_R = numpy.empty(R, numpy.double)
+    cdef numpy.ndarray[double, ndim = 1] out_R = numpy.empty(R, numpy.double)
+    cdef numpy.ndarray[double, ndim = 1] offsets_L
+    cdef double* offsets_p = NULL
+    cdef int B = (R + block - 1) // block
+    cdef int b
+
+    if log_offsets is not None:
+        offsets_L = log_offsets
+        offsets_p = &offsets_L[0]
+
+    if L == 0:
+        out_R[:] = -INFINITY
+    else:
+        for b in prange(B, nogil = True, num_threads = threads, schedule = "static"):
+            _logsumexp_columns(
+                L,
+                min(block, R - b * block),
+                R,
+                &in_LR[0, b * block],
+                offsets_p,
+                &maxima_R[b * block],
+                &out_R[b * block],
+                )
+
+    return out_R.reshape(array.shape[1:])
+
+@cython.boundscheck(False)
+def logsumexp(array, axis = None, int threads = 1, int block = 256):
+    """
+    Compute log(sum(exp(array))) over one or more axes, stably.
+
+    Each reduction is shifted by its maximum and runs without the GIL,
+    blocks of reductions in parallel.
+    """
+
+    array = numpy.asarray(array, numpy.double)
+
+    if axis is None:
+        axes = list(range(array.ndim))
+    elif numpy.isscalar(axis):
+        axes = [axis % array.ndim]
+    else:
+        axes = sorted(a % array.ndim for a in axis)
+
+    kept = [a for a in xrange(array.ndim) if a not in axes]
+
+    # leading reductions run down columns and need not move any data
+    if len(kept) > 0 and axes == list(range(len(axes))):
+        leading = numpy.ascontiguousarray(array).reshape((-1,) + array.shape[len(axes):])
+
+        return _leading_logsumexp(leading, None, threads, block)
+
+    moved = numpy.transpose(array, kept + axes)
+    kept_shape = moved.shape[:len(kept)]
+
+    cdef numpy.ndarray[double, ndim = 2] in_RL = numpy.ascontiguousarray(moved).reshape((int(numpy.prod(kept_shape)), -1))
+    cdef numpy.ndarray[double, ndim = 1] out_R = numpy.empty(in_RL.shape[0], numpy.double)
+    cdef int R = in_RL.shape[0]
+    cdef int L = in_RL.shape[1]
+    cdef int B = (R + block - 1) // block
+    cdef int b
+
+    if L == 0:
+        out_R[:] = -INFINITY
+    else:
+        for b in prange(B, nogil = True, num_threads = threads, schedule = "static"):
+            _logsumexp_rows(min(block, R - b * block), L, &in_RL[b * block, 0], &out_R[b * block])
+
+    if len(kept) == 0:
+        return out_R[0]
+    else:
+        return out_R.reshape(kept_shape)
+
+def weighted_logsumexp(array, log_weights, int threads = 1, int block = 256):
+    """
+    Compute log(sum(exp(log_weights + array))) over the leading axis, stably.
+
+    Equivalent to logsumexp(array + log_weights[:, None, ...], axis = 0), but
+    without the temporary sum; used to marginalize mixture components.
+    """
+
+    array = numpy.ascontiguousarray(array, numpy.double)
+    log_weights = numpy.ascontiguousarray(log_weights, numpy.double)
+
+    assert log_weights.shape == array.shape[:1]
+
+    return _leading_logsumexp(array, log_weights, threads, block)
+
+@cython.boundscheck(False)
+def logcumsumexp(array, axis = -1, reverse = False):
+    """
+    Compute log(cumsum(exp(array))) along an axis, stably.
+
+    With reverse, accumulate from the end; the reverse sums of log masses
+    past each bin are the log survival function.
+    """
+
+    array = numpy.asarray(array, numpy.double)
+    moved = numpy.rollaxis(array, axis % array.ndim, array.ndim)
+
+    if reverse:
+        moved = moved[..., ::-1]
+
+    cdef numpy.ndarray[double, ndim = 2] in_RL = numpy.ascontiguousarray(moved).reshape((-1, moved.shape[-1]))
+    cdef numpy.ndarray[double, ndim = 2] out_RL = numpy.empty_like(in_RL)
+    cdef int R = in_RL.shape[0]
+    cdef int L = in_RL.shape[1]
+    cdef double total
+    cdef int r
+    cdef int l
+
+    with nogil:
+        for r in xrange(R):
+            total = -INFINITY
+
+            for l in xrange(L):
+                total = log_plus(total, in_RL[r, l])
+                out_RL[r, l] = total
+
+    out = out_RL.reshape(moved.shape)
+
+    if reverse:
+        out = out[..., ::-1]
+
+    return numpy.rollaxis(out, array.ndim - 1, axis % array.ndim)
+
 #
 # SPECIAL FUNCTIONS
 #
@@ -296,108 +525,47 @@ cpdef double inverse_digamma_newton(double x) except? -1.0:
 # RANDOM VARIATES
 #
 
-cdef numpy.int32_t _prng_ix
-cdef numpy.int32_t _prng_iy
-cdef numpy.int32_t _prng_iz
-
-set_prng_seeds()
-
-cdef void _set_internal_prng_seed(numpy.int32_t ix, numpy.int32_t iy, numpy.int32_t iz):
-    """Set the state of the internal PRNG."""
+@cython.profile(False)
+cdef inline uint64_t _mix64(uint64_t z) nogil:
+    """Scramble the bits of a 64-bit integer; the SplitMix64 finalizer."""
 
-    global _prng_ix
-    global _prng_iy
-    global _prng_iz
+    z = (z ^ (z >> 30)) * 0xbf58476d1ce4e5b9ULL
+    z = (z ^ (z >> 27)) * 0x94d049bb133111ebULL
 
-    _prng_ix = (ix % 254) + 1
-    _prng_iy = (iy % 254) + 1
-    _prng_iz = (iz % 254) + 1
+    return z ^ (z >> 31)
 
-    global _prng_normal_cache_ok
+cdef void prng_seed(PRNGState* state, uint64_t seed, uint64_t stream) nogil:
+    """Reset a generator to the start of one stream under a seed."""
 
-    _prng_normal_cache_ok = False
+    state.key = _mix64(_mix64(seed) ^ _mix64(stream + 0x9e3779b97f4a7c15ULL))
+    state.counter = 0
+    state.spawned = 0
+    state.normal_cached = False
 
-@cython.infer_types(True)
-@cython.cdivision(True)
-cpdef double unit_uniform_rv():
+@cython.profile(False)
+cdef uint64_t prng_bits(PRNGState* state) nogil:
     """
-    Generate a uniformly-distributed random variate in [0.0,1.0).
+    Generate 64 uniformly-distributed random bits.
 
-    Implements the Wichmann-Hill PRNG.
+    Each draw is a keyed hash of the stream counter, so streams are
+    independent and any draw can be reproduced from (key, counter); see
+    Salmon et al., 2011.
     """
 
-    global _prng_ix
-    global _prng_iy
-    global _prng_iz
-
-    _prng_ix = (171 * _prng_ix) % 30269
-    _prng_iy = (172 * _prng_iy) % 30307
-    _prng_iz = (170 * _prng_iz) % 30323
-
-    u = _prng_ix / 30269.0 + _prng_iy / 30307.0 + _prng_iz / 30323.0
-
-    return u - <numpy.int32_t>u
-
-def categorical_rv(ps):
-    """Generate a categorically-distributed random variate."""
-
-    (D,) = ps.shape
-
-    cdef numpy.ndarray[double, ndim = 1] ps_D = ps
-
-    return categorical_rv_raw(D, &ps_D[0], ps_D.strides[0])
-
-@cython.infer_types(True)
-cdef int categorical_rv_raw(int D, double* ps, int ps_stride):
-    """Generate a categorically-distributed random variate."""
-
-    cdef void* ps_p = ps
+    cdef uint64_t bits = _mix64(_mix64(state.counter * 0x9e3779b97f4a7c15ULL ^ state.key) + state.key)
 
-    u = unit_uniform_rv()
+    state.counter += 1
 
-    total = 0.0
+    return bits
 
-    for d in xrange(D - 1):
-        total += (<double*>(ps_p + d * ps_stride))[0]
-
-        if total > u:
-            return d
-
-    return D - 1
-
-def categorical_rv_log(logps):
-    """Generate a categorically-distributed random variate."""
-
-    (D,) = logps.shape
-
-    cdef numpy.ndarray[double, ndim = 1] logps_D = logps
-
-    return categorical_rv_log_raw(D, &logps_D[0], logps_D.strides[0])
-
-@cython.infer_types(True)
-cdef int categorical_rv_log_raw(int D, double* logps, int logps_stride):
-    """Generate a categorically-distributed random variate."""
-
-    cdef void* logps_p = logps
-
-    u = libc.math.log(unit_uniform_rv())
-
-    total = -INFINITY
-
-    for d in xrange(D - 1):
-        total = log_plus(total, (<double*>(logps_p + d * logps_stride))[0])
-
-        if total > u:
-            return d
-
-    return D - 1
+@cython.profile(False)
+cdef double prng_uniform(PRNGState* state) nogil:
+    """Generate a uniformly-distributed random variate in [0.0,1.0)."""
 
-cdef double _prng_normal_cache
-cdef bint _prng_normal_cache_ok = False
+    return (prng_bits(state) >> 11) * (1.0 / 9007199254740992.0)
 
-@cython.infer_types(True)
 @cython.cdivision(True)
-cpdef double unit_normal_rv():
+cdef double prng_normal(PRNGState* state) nogil:
     """
     Generate a (unit) normally-distributed random variate.
 
@@ -405,13 +573,10 @@ cpdef double unit_normal_rv():
     """
 
     # return a value computed previously, if any
-    global _prng_normal_cache
-    global _prng_normal_cache_ok
+    if state.normal_cached:
+        state.normal_cached = False
 
-    if _prng_normal_cache_ok:
-        _prng_normal_cache_ok = False
-
-        return _prng_normal_cache
+        return state.normal_cache
 
     # generate a random point inside the unit circle
     cdef double x
@@ -419,8 +584,8 @@ cpdef double unit_normal_rv():
     cdef double radius
 
     while True:
-        x = 2.0 * unit_uniform_rv() - 1.0
-        y = 2.0 * unit_uniform_rv() - 1.0
+        x = 2.0 * prng_uniform(state) - 1.0
+        y = 2.0 * prng_uniform(state) - 1.0
 
         radius = (x * x) + (y * y)
 
@@ -433,26 +598,24 @@ cpdef double unit_normal_rv():
     x *= radius
     y *= radius
 
-    _prng_normal_cache = y
-    _prng_normal_cache_ok = True
+    state.normal_cache = y
+    state.normal_cached = True
 
     return x
 
 @cython.cdivision(True)
-cpdef double unit_gamma_rv(double shape) except? -1.0:
+cdef double prng_gamma(PRNGState* state, double shape) nogil:
     """
     Generate a gamma-distributed random variate with unit scale.
 
     See Marsaglia and Tsang, 2000; adapted from Minka.
     """
 
-    assert shape > 0.0
-
     # boost using Marsaglia's (1961) method
     cdef double boost
 
     if shape < 1.0:
-        boost = libc.math.exp(libc.math.log(unit_uniform_rv()) / shape)
+        boost = libc.math.exp(libc.math.log(prng_uniform(state)) / shape)
         shape += 1.0
     else:
         boost = 1.0
@@ -466,7 +629,7 @@ cpdef double unit_gamma_rv(double shape) except? -1.0:
 
     while True:
         while True:
-            x = unit_normal_rv()
+            x = prng_normal(state)
             v = 1.0 + c * x
 
             if v > 0:
@@ -474,13 +637,256 @@ cpdef double unit_gamma_rv(double shape) except? -1.0:
 
         v = v * v * v
         x = x * x
-        u = unit_uniform_rv()
+        u = prng_uniform(state)
 
         if (u < 1.0 - 0.0331 * x * x) or (libc.math.log(u) < 0.5 * x + d * (1.0 - v + libc.math.log(v))):
             break
 
     return boost * d * v
 
+cdef int prng_categorical(PRNGState* state, int D, double* ps, int ps_stride) nogil:
+    """Generate a categorically-distributed random variate."""
+
+    cdef void* ps_p = ps
+    cdef double u = prng_uniform(state)
+    cdef double total = 0.0
+    cdef int d
+
+    for d in xrange(D - 1):
+        total += (<double*>(ps_p + d * ps_stride))[0]
+
+        if total > u:
+            return d
+
+    return D - 1
+
+cdef int prng_categorical_log(PRNGState* state, int D, double* logps, int logps_stride) nogil:
+    """Generate a categorically-distributed random variate."""
+
+    cdef void* logps_p = logps
+    cdef double u = libc.math.log(prng_uniform(state))
+    cdef double total = -INFINITY
+    cdef int d
+
+    for d in xrange(D - 1):
+        total = log_plus(total, (<double*>(logps_p + d * logps_stride))[0])
+
+        if total > u:
+            return d
+
+    return D - 1
+
+def _prng_output(out, size, dtype):
+    """Allocate, or check, the output array of a batch of variates."""
+
+    if out is None:
+        out = numpy.empty(size, dtype)
+    else:
+        assert out.dtype == dtype
+        assert out.flags.c_contiguous
+
+    return out
+
+def _prng_stream_from_state(key, counter, spawned, normal_cache, normal_cached):
+    """Reconstruct a pickled PRNG stream."""
+
+    cdef PRNGStream stream = PRNGStream()
+
+    stream.state.key = key
+    stream.state.counter = counter
+    stream.state.spawned = spawned
+    stream.state.normal_cache = normal_cache
+    stream.state.normal_cached = normal_cached
+
+    return stream
+
+cdef class PRNGStream(object):
+    """
+    Independent stream of a counter-based PRNG.
+
+    Streams are cheap; give each thread, or each unit of parallel work, its
+    own, so that results do not depend on scheduling.
+    """
+
+    def __init__(self, seed = 0, stream = 0):
+        """Initialize."""
+
+        self.seed(seed, stream)
+
+    def __reduce__(self):
+        """Support pickling."""
+
+        return \
+            (
+                _prng_stream_from_state,
+                (
+                    self.state.key,
+                    self.state.counter,
+                    self.state.spawned,
+                    self.state.normal_cache,
+                    self.state.normal_cached,
+                    ),
+                )
+
+    def seed(self, seed, stream = 0):
+        """Reset to the start of a stream under a seed."""
+
+        prng_seed(&self.state, <uint64_t>seed, <uint64_t>stream)
+
+    def spawn(self, count):
+        """
+        Return a list of independent child streams.
+
+        Children are numbered in order across calls, so each call returns
+        new streams; a parent reseeded identically spawns the same ones.
+        """
+
+        children = [PRNGStream(self.state.key, self.state.spawned + i + 1) for i in xrange(count)]
+
+        self.state.spawned += count
+
+        return children
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def uniform(self, size = None, out = None):
+        """Fill an array with uniformly-distributed variates in [0.0,1.0)."""
+
+        out = _prng_output(out, size, numpy.double)
+
+        cdef numpy.ndarray[double, ndim = 1] out_X = out.reshape(-1)
+        cdef int x
+
+        with nogil:
+            for x in xrange(out_X.shape[0]):
+                out_X[x] = prng_uniform(&self.state)
+
+        return out
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def normal(self, size = None, out = None):
+        """Fill an array with (unit) normally-distributed variates."""
+
+        out = _prng_output(out, size, numpy.double)
+
+        cdef numpy.ndarray[double, ndim = 1] out_X = out.reshape(-1)
+        cdef int x
+
+        with nogil:
+            for x in xrange(out_X.shape[0]):
+                out_X[x] = prng_normal(&self.state)
+
+        return out
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def gamma(self, shape, out = None):
+        """Fill an array with unit-scale gamma variates of the given shapes."""
+
+        shape = numpy.ascontiguousarray(shape, numpy.double)
+
+        assert numpy.all(shape > 0.0)
+
+        out = _prng_output(out, shape.shape, numpy.double)
+
+        assert out.shape == shape.shape
+
+        cdef numpy.ndarray[double, ndim = 1] shape_X = shape.reshape(-1)
+        cdef numpy.ndarray[double, ndim = 1] out_X = out.reshape(-1)
+        cdef int x
+
+        with nogil:
+            for x in xrange(out_X.shape[0]):
+                out_X[x] = prng_gamma(&self.state, shape_X[x])
+
+        return out
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def categorical_log(self, logps, out = None):
+        """Fill an array with a categorical variate from each row of log probabilities."""
+
+        cdef numpy.ndarray[double, ndim = 2] logps_ND = numpy.asarray(logps, numpy.double)
+
+        out = _prng_output(out, logps_ND.shape[0], numpy.intc)
+
+        cdef numpy.ndarray[int, ndim = 1] out_N = out
+        cdef int D = logps_ND.shape[1]
+        cdef int stride = logps_ND.strides[1]
+        cdef int n
+
+        with nogil:
+            for n in xrange(out_N.shape[0]):
+                out_N[n] = prng_categorical_log(&self.state, D, &logps_ND[n, 0], stride)
+
+        return out
+
+    property counter:
+        """Number of uniform variates drawn so far."""
+
+        def __get__(self):
+            return self.state.counter
+
+cdef PRNGStream _default_stream = PRNGStream()
+
+set_prng_seeds()
+
+def default_prng_stream():
+    """Return the stream used by the module-level variate functions."""
+
+    return _default_stream
+
+cpdef double unit_uniform_rv():
+    """Generate a uniformly-distributed random variate in [0.0,1.0)."""
+
+    return prng_uniform(&_default_stream.state)
+
+def categorical_rv(ps):
+    """Generate a categorically-distributed random variate."""
+
+    (D,) = ps.shape
+
+    cdef numpy.ndarray[double, ndim = 1] ps_D = ps
+
+    return categorical_rv_raw(D, &ps_D[0], ps_D.strides[0])
+
+cdef int categorical_rv_raw(int D, double* ps, int ps_stride):
+    """Generate a categorically-distributed random variate."""
+
+    return prng_categorical(&_default_stream.state, D, ps, ps_stride)
+
+def categorical_rv_log(logps):
+    """Generate a categorically-distributed random variate."""
+
+    (D,) = logps.shape
+
+    cdef numpy.ndarray[double, ndim = 1] logps_D = logps
+
+    return categorical_rv_log_raw(D, &logps_D[0], logps_D.strides[0])
+
+def categorical_rvs_log(logps):
+    """Generate a categorically-distributed random variate from each row."""
+
+    return _default_stream.categorical_log(logps)
+
+cdef int categorical_rv_log_raw(int D, double* logps, int logps_stride):
+    """Generate a categorically-distributed random variate."""
+
+    return prng_categorical_log(&_default_stream.state, D, logps, logps_stride)
+
+cpdef double unit_normal_rv():
+    """Generate a (unit) normally-distributed random variate."""
+
+    return prng_normal(&_default_stream.state)
+
+cpdef double unit_gamma_rv(double shape) except? -1.0:
+    """Generate a gamma-distributed random variate with unit scale."""
+
+    assert shape > 0.0
+
+    return prng_gamma(&_default_stream.state, shape)
+
 @cython.infer_types(True)
 @cython.cdivision(True)
 cdef int post_dirichlet_rv(
@@ -518,6 +924,125 @@ cdef int post_dirichlet_rv(
 
     return 0
 
+@cython.cdivision(True)
+cdef void _gamma_rvs_block(
+    uint64_t seed,
+    uint64_t block,
+    int size,
+    double* shapes,
+    double* out,
+    ) nogil:
+    """Draw a block of gamma variates from the block's own stream."""
+
+    cdef PRNGState state
+    cdef int i
+
+    prng_seed(&state, seed, block)
+
+    for i in xrange(size):
+        out[i] = prng_gamma(&state, shapes[i])
+
+@cython.cdivision(True)
+cdef void _dirichlet_rv_row(
+    uint64_t seed,
+    uint64_t row,
+    int D,
+    double* alphas,
+    double* out,
+    ) nogil:
+    """Draw one Dirichlet variate from the row's own stream."""
+
+    cdef PRNGState state
+    cdef double l1_norm = 0.0
+    cdef int d
+
+    prng_seed(&state, seed, row)
+
+    # small shapes can draw exact zeros; clamp them so that the normalizer is
+    # positive and the logs taken by callers stay finite
+    for d in xrange(D):
+        out[d] = libc.math.fmax(prng_gamma(&state, alphas[d]), 1e-64)
+
+        l1_norm += out[d]
+
+    for d in xrange(D):
+        out[d] /= l1_norm
+
+def _rvs_stream(stream):
+    """Draw the seed of a batch of variates from a PRNG stream."""
+
+    if stream is None:
+        stream = _default_stream
+
+    return prng_bits(&(<PRNGStream?>stream).state)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def gamma_rvs(shape, out = None, stream = None, int threads = 1, int block = 4096):
+    """
+    Fill an array with unit-scale gamma variates of the given shapes.
+
+    Blocks of variates are drawn in parallel, each from its own stream, so
+    the result depends only on the seed stream and not on the threads.
+    """
+
+    shape = numpy.ascontiguousarray(shape, numpy.double)
+
+    assert numpy.all(shape > 0.0)
+
+    out = _prng_output(out, shape.shape, numpy.double)
+
+    assert out.shape == shape.shape
+
+    cdef numpy.ndarray[double, ndim = 1] shape_X = shape.reshape(-1)
+    cdef numpy.ndarray[double, ndim = 1] out_X = out.reshape(-1)
+    cdef uint64_t seed = _rvs_stream(stream)
+    cdef int X = shape_X.shape[0]
+    cdef int B = (X + block - 1) // block
+    cdef int b
+
+    if X > 0:
+        for b in prange(B, nogil = True, num_threads = threads, schedule = "static"):
+            _gamma_rvs_block(
+                seed,
+                b,
+                min(block, X - b * block),
+                &shape_X[b * block],
+                &out_X[b * block],
+                )
+
+    return out
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def dirichlet_rvs(alpha, int count, out = None, stream = None, int threads = 1):
+    """
+    Draw count variates from each of the (K, D) Dirichlet distributions.
+
+    Returns the (count, K, D) array of variates, drawn in parallel.
+    """
+
+    cdef numpy.ndarray[double, ndim = 2] alpha_KD = numpy.ascontiguousarray(alpha, numpy.double)
+
+    assert numpy.all(alpha_KD > 0.0)
+
+    cdef int K = alpha_KD.shape[0]
+    cdef int D = alpha_KD.shape[1]
+
+    out = _prng_output(out, (count, K, D), numpy.double)
+
+    assert out.shape == (count, K, D)
+
+    cdef numpy.ndarray[double, ndim = 2] out_RD = out.reshape((count * K, D))
+    cdef uint64_t seed = _rvs_stream(stream)
+    cdef int r
+
+    if D > 0:
+        for r in prange(count * K, nogil = True, num_threads = threads, schedule = "static"):
+            _dirichlet_rv_row(seed, r, D, &alpha_KD[r % K, 0], &out_RD[r, 0])
+
+    return out
+
 #
 # DISTRIBUTION FUNCTIONS
 #
@@ -527,10 +1052,11 @@ cdef double standard_normal_log_pdf(double x):
 
     return -(x * x) / 2.0 - libc.math.log(2.0 * libc.math.M_PI) / 2.0
 
-cdef double standard_normal_log_cdf(double x):
+cdef double standard_normal_log_cdf(double x) nogil:
     """Compute the log of the standard normal CDF."""
 
-    return libc.math.log((1.0 + libc.math.erf(x / libc.math.M_SQRT2)) / 2.0)
+    # erfc keeps precision far into the lower tail, where 1 + erf does not
+    return libc.math.log(libc.math.erfc(-x / libc.math.M_SQRT2) / 2.0)
 
 cdef double normal_log_pdf(double mu, double sigma, double x):
     """Compute the log of the normal PDF."""
@@ -577,7 +1103,7 @@ cdef double log_normal_log_pdf(double mu, double sigma, double theta, double x):
 
     return lhs - rhs
 
-cdef double log_normal_log_cdf(double mu, double sigma, double theta, double x):
+cdef double log_normal_log_cdf(double mu, double sigma, double theta, double x) nogil:
     """Compute the log of the (three-parameter) log-normal CDF."""
 
     if x <= theta:
@@ -725,7 +1251,7 @@ cdef double dcm_log_pdf_raw(
     int D,
     double* alpha, int alpha_stride,
     int* counts, int counts_stride,
-    ):
+    ) nogil:
     """Compute the log of the DCM PDF."""
 
     #cdef numpy.ndarray[double, ndim = 1] alpha_D = alpha
@@ -733,17 +1259,19 @@ cdef double dcm_log_pdf_raw(
     cdef void* alpha_p = alpha
     cdef void* counts_p = counts
     cdef double total = 0.0
+    cdef int sign
     cdef int d
 
     for d in xrange(D):
         total += (<double*>(alpha_p + alpha_stride * d))[0]
 
-    cdef double log_density = libc.math.lgamma(total)
+    # lgamma_r, since lgamma writes the global signgam from parallel callers
+    cdef double log_density = lgamma_r(total, &sign)
 
     for d in xrange(D):
         total += (<int*>(counts_p + counts_stride * d))[0]
 
-    log_density -= libc.math.lgamma(total)
+    log_density -= lgamma_r(total, &sign)
 
     cdef double alpha_d
     cdef int counts_d
@@ -752,8 +1280,8 @@ cdef double dcm_log_pdf_raw(
         alpha_d = (<double*>(alpha_p + alpha_stride * d))[0]
         counts_d = (<int*>(counts_p + counts_stride * d))[0]
 
-        log_density += libc.math.lgamma(counts_d + alpha_d)
-        log_density -= libc.math.lgamma(alpha_d)
+        log_density += lgamma_r(counts_d + alpha_d, &sign)
+        log_density -= lgamma_r(alpha_d, &sign)
 
     return log_density
 
@@ -886,60 +1414,108 @@ def dirichlet_estimate_map(vectors, double shape = 1.0, double scale = 1e8):
 
     return alpha_D
 
-def dcm_estimate_ml_wallach_raw(alpha, counts, weights):
+class DCMStatistics(object):
     """
-    Compute the maximum-likelihood DCM distribution.
+    Sufficient statistics of a set of DCM count rows.
 
-    Implements Wallach's digamma recurrence-relation modification to Minka's
-    fixed-point iteration.
+    Identical rows are grouped once, up front, so that weighted appearance
+    histograms cost time in the number of unique rows.
     """
 
-    cdef int N = counts.shape[0]
-    cdef int D = counts.shape[1]
-    cdef int M = numpy.max(counts)
-    cdef int L = numpy.max(numpy.sum(counts, axis = -1))
+    def __init__(self, counts, int M = -1, int L = -1):
+        """Group the rows of an (N, D) count matrix."""
 
-    cdef numpy.ndarray[int, ndim = 2] counts_ND = counts
-    cdef numpy.ndarray[double, ndim = 1] alpha_D = alpha
-    cdef numpy.ndarray[double, ndim = 1] weights_N = weights
-    cdef numpy.ndarray[double, ndim = 1] appearances_L = numpy.zeros(L, numpy.double)
-    cdef numpy.ndarray[double, ndim = 2] appearances_MD = numpy.zeros((M, D), numpy.double)
+        (self.counts, self.inverse) = unique_rows(counts)
+        self.multiplicities = numpy.bincount(self.inverse, minlength = self.counts.shape[0])
 
-    # compute appearance histograms
-    cdef int n
-    cdef int d
-    cdef int l
-    cdef int m
+        D = self.counts.shape[1]
 
-    for n in xrange(N):
-        for d in xrange(D):
-            m = counts_ND[n, d]
+        # index the nonzero histogram cells of each unique row
+        totals_U = numpy.sum(self.counts, axis = -1)
 
-            if m > 0:
-                appearances_MD[m - 1, d] += weights_N[n]
+        if M < 0:
+            M = max(numpy.max(self.counts), 1)
+        if L < 0:
+            L = max(numpy.max(totals_U), 1)
 
-        l = 0
+        (self.M, self.L) = (M, L)
+        (self._count_rows, dims) = numpy.nonzero(self.counts)
+        self._count_cells = (self.counts[self._count_rows, dims] - 1) * D + dims
+        (self._total_rows,) = numpy.nonzero(totals_U)
+        self._total_cells = totals_U[self._total_rows] - 1
 
-        for d in xrange(D):
-            l += counts_ND[n, d]
+    def get_unique_weights(self, weights):
+        """Sum (K, N) per-row weights over each group of identical rows."""
+
+        weights_KN = numpy.asarray(weights, numpy.double)
+        (U, K) = (self.counts.shape[0], weights_KN.shape[0])
 
-        if l > 0:
-            appearances_L[l - 1] += weights_N[n]
+        return \
+            numpy.bincount(
+                (numpy.arange(K)[:, None] * U + self.inverse[None, :]).ravel(),
+                weights = weights_KN.ravel(),
+                minlength = K * U,
+                ) \
+                .reshape((K, U))
 
-    # run through the fixed-point iteration
+    def get_histograms(self, weights):
+        """
+        Compute weighted appearance histograms under several sets of weights.
+
+        Returns histograms of counts, (K, M, D), and of count totals, (K, L),
+        with each row n weighted by weights[k, n].
+        """
+
+        weights_KU = self.get_unique_weights(weights)
+
+        (K, (U, D)) = (weights_KU.shape[0], self.counts.shape)
+        (M, L) = (self.M, self.L)
+
+        appearances_KMD = \
+            numpy.bincount(
+                (numpy.arange(K)[:, None] * (M * D) + self._count_cells[None, :]).ravel(),
+                weights = weights_KU[:, self._count_rows].ravel(),
+                minlength = K * M * D,
+                )
+        appearances_KL = \
+            numpy.bincount(
+                (numpy.arange(K)[:, None] * L + self._total_cells[None, :]).ravel(),
+                weights = weights_KU[:, self._total_rows].ravel(),
+                minlength = K * L,
+                )
+
+        return (appearances_KMD.reshape((K, M, D)), appearances_KL.reshape((K, L)))
+
+@cython.cdivision(True)
+cdef void dcm_estimate_ml_wallach_fixed_point(
+    int D,
+    int M,
+    int L,
+    double* alpha, int alpha_stride,
+    double* appearances_MD,
+    double* appearances_L,
+    ) nogil:
+    """Run Wallach's fixed-point iteration from precomputed histograms."""
+
+    cdef void* alpha_p = alpha
+    cdef double* alpha_d
     cdef double numerator
     cdef double denominator
     cdef double alpha_sum
     cdef double inner_sum
     cdef double change
     cdef double next_alpha_d
+    cdef int i
+    cdef int d
+    cdef int l
+    cdef int m
 
     for i in xrange(1024):
         # compute the magnitude of alpha
         alpha_sum = 0.0
 
         for d in xrange(D):
-            alpha_sum += alpha_D[d]
+            alpha_sum += (<double*>(alpha_p + alpha_stride * d))[0]
 
         # compute the update-ratio denominator
         denominator = 0.0
@@ -949,28 +1525,56 @@ def dcm_estimate_ml_wallach_raw(alpha, counts, weights):
             inner_sum += 1.0 / (l + alpha_sum)
             denominator += appearances_L[l] * inner_sum
 
+        if denominator == 0.0:
+            # no weight on any nonempty row; leave alpha alone
+            break
+
         # compute the per-dimensional numerators
         change = 0.0
 
         for d in xrange(D):
+            alpha_d = <double*>(alpha_p + alpha_stride * d)
             numerator = 0.0
             inner_sum = 0.0
 
             for m in xrange(M):
-                inner_sum += 1.0 / (m + alpha_D[d] + 1e-16)
-                numerator += appearances_MD[m, d] * inner_sum
+                inner_sum += 1.0 / (m + alpha_d[0] + 1e-16)
+                numerator += appearances_MD[m * D + d] * inner_sum
 
-            next_alpha_d = alpha_D[d] * numerator / denominator
+            next_alpha_d = alpha_d[0] * numerator / denominator
 
             if next_alpha_d < 1e-16:
                 next_alpha_d = 1e-16
 
-            change += libc.math.fabs(alpha_D[d] - next_alpha_d)
-            alpha_D[d] = next_alpha_d
+            change += libc.math.fabs(alpha_d[0] - next_alpha_d)
+            alpha_d[0] = next_alpha_d
 
         if change < 1e-10:
             break
 
+def dcm_estimate_ml_wallach_raw(alpha, counts, weights):
+    """
+    Compute the maximum-likelihood DCM distribution.
+
+    Implements Wallach's digamma recurrence-relation modification to Minka's
+    fixed-point iteration.
+    """
+
+    (appearances_KMD, appearances_KL) = DCMStatistics(counts).get_histograms([weights])
+
+    cdef numpy.ndarray[double, ndim = 1] alpha_D = alpha
+    cdef numpy.ndarray[double, ndim = 3] appearances_1MD = appearances_KMD
+    cdef numpy.ndarray[double, ndim = 2] appearances_1L = appearances_KL
+
+    dcm_estimate_ml_wallach_fixed_point(
+        alpha_D.shape[0],
+        appearances_1MD.shape[1],
+        appearances_1L.shape[1],
+        &alpha_D[0], alpha_D.strides[0],
+        &appearances_1MD[0, 0, 0],
+        &appearances_1L[0, 0],
+        )
+
 def dcm_estimate_ml_wallach(counts, weights = None):
     """Compute the maximum-likelihood DCM distribution."""
 
@@ -984,12 +1588,166 @@ def dcm_estimate_ml_wallach(counts, weights = None):
 
     return alpha
 
+class EMDriver(object):
+    """
+    Run the iterations of an EM fit.
+
+    Decides when the likelihood has converged and, given a path, periodically
+    checkpoints the fit's state so that an interrupted fit can be resumed.
+    """
+
+    def __init__(
+        self,
+        iterations,
+        tolerance = 1e-8,
+        relative_tolerance = 0.0,
+        checkpoint_path = None,
+        identity = (),
+        ):
+        """Initialize, resuming from a matching checkpoint if one exists."""
+
+        self._iterations = iterations
+        self._tolerance = tolerance
+        self._relative_tolerance = relative_tolerance
+        self._checkpoint_path = checkpoint_path
+        self._saved_at = time.time()
+        self._start = 0
+
+        self.previous_ll = -INFINITY
+        self.state = None
+
+        if checkpoint_path is not None:
+            self._key = EMDriver.identify(identity)
+
+            if os.path.exists(checkpoint_path):
+                with open(checkpoint_path, "rb") as checkpoint_file:
+                    checkpoint = pickle.load(checkpoint_file)
+
+                if checkpoint["key"] == self._key:
+                    self._start = checkpoint["iteration"] + 1
+                    self.previous_ll = checkpoint["ll"]
+                    self.state = checkpoint["state"]
+
+                    logger.info("resuming EM at iteration %i from %s", self._start, checkpoint_path)
+                else:
+                    logger.warning("ignoring EM checkpoint %s of a different fit", checkpoint_path)
+
+    def __iter__(self):
+        """Iterate over the remaining iteration numbers."""
+
+        return iter(xrange(self._start, self._iterations))
+
+    def converged(self, i, ll):
+        """Record the log likelihood at an iteration; has EM converged?"""
+
+        delta_ll = ll - self.previous_ll
+
+        self.previous_ll = ll
+
+        if delta_ll >= 0.0:
+            logger.debug("ll at EM iteration %i is %f", i, ll)
+
+            return delta_ll <= max(self._tolerance, self._relative_tolerance * abs(ll))
+        else:
+            logger.warning("ll at EM iteration %i is %f <-- DECLINE", i, ll)
+
+            return False
+
+    def checkpoint(self, i, **state):
+        """Save the state at the end of an iteration, if a checkpoint is due."""
+
+        if self._checkpoint_path is None:
+            return
+        if time.time() - self._saved_at < borg.defaults.em_checkpoint_interval:
+            return
+
+        checkpoint = {"key": self._key, "iteration": i, "ll": self.previous_ll, "state": state}
+        (fd, partial_path) = \
+            tempfile.mkstemp(
+                suffix = ".partial",
+                dir = os.path.dirname(os.path.abspath(self._checkpoint_path)),
+                )
+
+        try:
+            with os.fdopen(fd, "wb") as partial_file:
+                pickle.dump(checkpoint, partial_file, protocol = -1)
+
+            os.rename(partial_path, self._checkpoint_path)
+        except:
+            os.unlink(partial_path)
+
+            raise
+
+        self._saved_at = time.time()
+
+        logger.debug("checkpointed EM iteration %i to %s", i, self._checkpoint_path)
+
+    @staticmethod
+    def identify(identity):
+        """Hash the arrays and parameters that identify a fit."""
+
+        hash_ = hashlib.sha1()
+
+        for part in identity:
+            if isinstance(part, (tuple, list)):
+                hash_.update(EMDriver.identify(part))
+            elif isinstance(part, numpy.ndarray):
+                hash_.update(str(part.dtype))
+                hash_.update(str(part.shape))
+                hash_.update(numpy.ascontiguousarray(part).tostring())
+            else:
+                hash_.update(repr(part))
+
+        return hash_.hexdigest()
+
+def warm_start_mixture(components, initial):
+    """
+    Seed the leading mixture components from a previous, smaller fit.
+
+    The previous fit is a (components, log responsibilities) pair; its
+    components keep their relative weights, and each new component is
+    given weight 1 / K. Returns the resulting log weights.
+    """
+
+    (initial_components, initial_log_responsibilities_KN) = initial
+
+    K = components.shape[0]
+    (K_, N) = initial_log_responsibilities_KN.shape
+
+    if K_ > K:
+        raise ValueError("cannot warm-start {0} components from {1}".format(K, K_))
+    if initial_components.shape != (K_,) + components.shape[1:]:
+        raise ValueError("warm-start components have the wrong shape")
+
+    components[:K_] = initial_components
+
+    log_weights_K = numpy.zeros(K) - numpy.log(K)
+    log_weights_K[:K_] = numpy.logaddexp.reduce(initial_log_responsibilities_KN, axis = 1)
+    log_weights_K[:K_] += numpy.log(K_) - numpy.log(K) - numpy.log(N)
+
+    return log_weights_K
+
 @cython.wraparound(False)
 @cython.infer_types(True)
 @cython.boundscheck(False)
 @cython.cdivision(True)
-def dcm_mixture_estimate_ml(counts, int K, alpha = None):
-    """Fit a DCM mixture using EM."""
+def dcm_mixture_estimate_ml(
+    counts,
+    int K,
+    alpha = None,
+    int threads = 1,
+    initial = None,
+    int iterations = 128,
+    double tolerance = 1e-8,
+    double relative_tolerance = 0.0,
+    checkpoint_path = None,
+    ):
+    """
+    Fit a DCM mixture using EM; the M-step is spread over threads.
+
+    A previous fit, as returned by this function, may be passed as the
+    initial value; see warm_start_mixture().
+    """
 
     # mise en place
     cdef int N = counts.shape[0]
@@ -1005,23 +1763,45 @@ def dcm_mixture_estimate_ml(counts, int K, alpha = None):
     components /= numpy.sum(components, axis = -1)[..., None] + 1e-32
     components += 1e-1
 
+    if initial is None:
+        log_weights_K = numpy.zeros(K) - libc.math.log(K)
+    else:
+        log_weights_K = warm_start_mixture(components, initial)
+
+    driver = \
+        EMDriver(
+            iterations,
+            tolerance,
+            relative_tolerance,
+            checkpoint_path,
+            identity = ["dcm_mixture", counts, K, alpha, initial],
+            )
+
+    if driver.state is not None:
+        components[...] = driver.state["components"]
+        log_weights_K = driver.state["log_weights"]
+        log_responsibilities_KN = driver.state["log_responsibilities"]
+
     cdef numpy.ndarray[int, ndim = 2] counts_ND = counts
     cdef numpy.ndarray[double, ndim = 2] components_KD = components
     cdef numpy.ndarray[double, ndim = 2] log_densities_KN = numpy.empty((K, N), numpy.double)
 
-    log_weights_K = numpy.zeros(K) - libc.math.log(K)
-
     # expectation maximization
     cdef unsigned int components_KD_stride1 = components_KD.strides[1]
     cdef unsigned int counts_ND_stride1 = counts_ND.strides[1]
 
-    cdef double previous_ll = -INFINITY
+    cdef numpy.ndarray[double, ndim = 3] appearances_KMD
+    cdef numpy.ndarray[double, ndim = 2] appearances_KL
+    statistics = DCMStatistics(counts_ND)
+
+    cdef int M = statistics.M
+    cdef int L = statistics.L
 
     cdef int i
     cdef int k
     cdef int n
 
-    for i in xrange(128):
+    for i in driver:
         # compute new responsibilities
         for k in xrange(K):
             for n in xrange(N):
@@ -1043,30 +1823,39 @@ def dcm_mixture_estimate_ml(counts, int K, alpha = None):
         ll = numpy.sum(ll_each)
 
         # check for convergence
-        delta_ll = ll - previous_ll
-        previous_ll = ll
-
-        if delta_ll >= 0.0:
-            logger.debug("ll at EM iteration %i is %f", i, ll)
-
-            if delta_ll <= 1e-8:
-                break
-        else:
-            logger.warning("ll at EM iteration %i is %f <-- DECLINE", i, ll)
+        if driver.converged(i, ll):
+            break
 
         # compute new components
         responsibilities_KN = numpy.exp(log_responsibilities_KN)
 
-        for k in xrange(K):
-            if alpha is None:
-                dcm_estimate_ml_wallach_raw(components_KD[k], counts_ND, responsibilities_KN[k])
+        if alpha is None:
+            (appearances_KMD, appearances_KL) = statistics.get_histograms(responsibilities_KN)
+
+            for k in prange(K, nogil = True, num_threads = threads, schedule = "dynamic"):
+                dcm_estimate_ml_wallach_fixed_point(
+                    D,
+                    M,
+                    L,
+                    &components_KD[k, 0], components_KD_stride1,
+                    &appearances_KMD[k, 0, 0],
+                    &appearances_KL[k, 0],
+                    )
 
-                components_KD[k] += 1e-16
-            else:
+            components_KD += 1e-16
+        else:
+            for k in xrange(K):
                 # fast approximation to fixed-alpha Dirichlet estimation
                 components_KD[k, :] = numpy.sum((counts_ND + 1e-4) * responsibilities_KN[k, :, None], axis = 0)
                 components_KD[k, :] *= alpha / numpy.sum(components_KD[k, :])
 
+        driver.checkpoint(
+            i,
+            components = components_KD,
+            log_weights = log_weights_K,
+            log_responsibilities = log_responsibilities_KN,
+            )
+
     assert_log_weights(log_responsibilities_KN, axis = 0)
 
     return (components_KD, log_responsibilities_KN)
@@ -1075,8 +1864,31 @@ def dcm_mixture_estimate_ml(counts, int K, alpha = None):
 @cython.infer_types(True)
 @cython.boundscheck(False)
 @cython.cdivision(True)
-def dcm_matrix_mixture_estimate_ml(counts, int K, alpha = None):
-    """Fit a DCM mixture using EM."""
+def dcm_matrix_mixture_estimate_ml(
+    counts,
+    int K,
+    alpha = None,
+    int threads = 1,
+    initial = None,
+    int iterations = 128,
+    double tolerance = 1e-8,
+    double relative_tolerance = 0.0,
+    checkpoint_path = None,
+    batch_size = None,
+    double step_decay = 0.6,
+    ):
+    """
+    Fit a DCM mixture using EM; both steps are spread over threads.
+
+    A previous fit, as returned by this function, may be passed as the
+    initial value; see warm_start_mixture().
+
+    Given a batch size, each iteration instead runs stochastic (online) EM
+    on a random mini-batch of instances: the sufficient statistics are
+    averaged over iterations with step size (i + 1) ** -step_decay, for a
+    step decay in (0.5, 1]. Iterations are then cheap and not checked for
+    convergence; one full E step computes the final responsibilities.
+    """
 
     # mise en place
     cdef int N = counts.shape[0]
@@ -1095,72 +1907,222 @@ def dcm_matrix_mixture_estimate_ml(counts, int K, alpha = None):
     components /= numpy.sum(components, axis = -1)[..., None] + 1e-32
     components += 1e-1
 
+    if initial is None:
+        log_weights_K = numpy.zeros(K) - libc.math.log(K)
+    else:
+        log_weights_K = warm_start_mixture(components, initial)
+
     cdef numpy.ndarray[int, ndim = 3] counts_NSD = counts
     cdef numpy.ndarray[double, ndim = 3] components_KSD = components
-    cdef numpy.ndarray[double, ndim = 2] log_densities_KN = numpy.empty((K, N), numpy.double)
 
-    log_weights_K = numpy.zeros(K) - libc.math.log(K)
+    # densities depend only on the counts, so evaluate them once per distinct instance
+    (unique_counts, inverse_N) = unique_rows(counts_NSD)
+
+    cdef numpy.ndarray[int, ndim = 3] counts_USD = unique_counts
+    cdef numpy.ndarray[double, ndim = 2] log_densities_KU = numpy.empty((K, counts_USD.shape[0]), numpy.double)
+    cdef numpy.ndarray[int, ndim = 1] rows_R
+    cdef int U = counts_USD.shape[0]
+
+    # sufficient statistics of the M step, averaged over mini-batches
+    cdef numpy.ndarray[double, ndim = 4] appearances_SKMD
+    cdef numpy.ndarray[double, ndim = 3] appearances_SKL
+    cdef int M = max(numpy.max(counts_NSD), 1)
+    cdef int L = max(numpy.max(numpy.sum(counts_NSD, axis = -1)), 1)
+
+    if alpha is None:
+        appearances_SKMD = numpy.zeros((S, K, M, D), numpy.double)
+        appearances_SKL = numpy.zeros((S, K, L), numpy.double)
+    else:
+        totals_KSD = numpy.zeros((K, S, D), numpy.double)
+
+    if batch_size is None:
+        statistics_S = [DCMStatistics(counts_NSD[:, s_, :], M, L) for s_ in xrange(S)]
+    else:
+        stream = PRNGStream(numpy.random.randint(2**31))
+
+    driver = \
+        EMDriver(
+            iterations,
+            tolerance,
+            relative_tolerance,
+            checkpoint_path,
+            identity = \
+                ["dcm_matrix_mixture", counts, K, alpha, initial] \
+                + ([] if batch_size is None else [batch_size, step_decay]),
+            )
+
+    if driver.state is not None:
+        components[...] = driver.state["components"]
+        log_weights_K = driver.state["log_weights"]
+
+        if batch_size is None:
+            log_responsibilities_KN = driver.state["log_responsibilities"]
+        else:
+            stream = driver.state["stream"]
+
+            if alpha is None:
+                appearances_SKMD[...] = driver.state["appearances_SKMD"]
+                appearances_SKL[...] = driver.state["appearances_SKL"]
+            else:
+                totals_KSD[...] = driver.state["totals"]
 
     # expectation maximization
     cdef unsigned int components_KSD_stride2 = components_KSD.strides[2]
-    cdef unsigned int counts_NSD_stride2 = counts_NSD.strides[2]
+    cdef unsigned int counts_USD_stride2 = counts_USD.strides[2]
 
-    cdef double previous_ll = -INFINITY
+    cdef double log_density
+    cdef double step
 
     cdef int i
+    cdef int j
     cdef int k
-    cdef int n
+    cdef int r
+    cdef int u
     cdef int s
 
-    for i in xrange(128):
-        # compute new responsibilities
-        for k in xrange(K):
-            for n in xrange(N):
-                log_densities_KN[k, n] = 0.0
+    all_rows_R = numpy.arange(U, dtype = numpy.intc)
+
+    for i in driver:
+        # pick the instances of this iteration
+        if batch_size is None:
+            batch_X = None
+            rows_R = all_rows_R
+            step = 1.0
+        else:
+            batch_X = (stream.uniform(batch_size) * N).astype(numpy.intp)
+            rows_R = numpy.unique(inverse_N[batch_X]).astype(numpy.intc)
+            step = (i + 1.0) ** -step_decay
+
+        # compute new responsibilities, one instance per thread at a time
+        for r in prange(rows_R.shape[0], nogil = True, num_threads = threads, schedule = "static"):
+            u = rows_R[r]
+
+            for k in xrange(K):
+                log_density = 0.0
 
                 for s in xrange(S):
-                    log_densities_KN[k, n] += \
+                    log_density = log_density + \
                         dcm_log_pdf_raw(
                             D,
                             &components_KSD[k, s, 0], components_KSD_stride2,
-                            &counts_NSD[n, s, 0], counts_NSD_stride2,
+                            &counts_USD[u, s, 0], counts_USD_stride2,
                             )
 
-        log_responsibilities_KN = log_densities_KN + log_weights_K[..., None]
-        log_responsibilities_KN -= numpy.logaddexp.reduce(log_responsibilities_KN, axis = 0)
+                log_densities_KU[k, u] = log_density
 
-        log_weights_K = numpy.logaddexp.reduce(log_responsibilities_KN, axis = 1)
-        log_weights_K -= numpy.log(N)
+        if batch_X is None:
+            log_densities_KX = log_densities_KU[:, inverse_N]
+        else:
+            log_densities_KX = log_densities_KU[:, inverse_N[batch_X]]
+
+        log_responsibilities_KX = log_densities_KX + log_weights_K[..., None]
+        log_responsibilities_KX -= numpy.logaddexp.reduce(log_responsibilities_KX, axis = 0)
+
+        batch_log_weights_K = numpy.logaddexp.reduce(log_responsibilities_KX, axis = 1)
+        batch_log_weights_K -= numpy.log(log_responsibilities_KX.shape[1])
 
         # compute ll
-        ll_each = numpy.logaddexp.reduce(log_weights_K[:, None] + log_densities_KN, axis = 0)
+        ll_each = numpy.logaddexp.reduce(batch_log_weights_K[:, None] + log_densities_KX, axis = 0)
         ll = numpy.sum(ll_each)
 
-        # check for convergence
-        delta_ll = ll - previous_ll
-        previous_ll = ll
-
-        if delta_ll >= 0.0:
-            logger.debug("ll at EM iteration %i is %f", i, ll)
+        if batch_X is None:
+            log_weights_K = batch_log_weights_K
+            log_responsibilities_KN = log_responsibilities_KX
 
-            if delta_ll <= 1e-8:
+            # check for convergence
+            if driver.converged(i, ll):
                 break
         else:
-            logger.warning("ll at EM iteration %i is %f <-- DECLINE", i, ll)
+            log_weights_K = \
+                numpy.logaddexp(
+                    numpy.log1p(-step) + log_weights_K if step < 1.0 else -INFINITY,
+                    numpy.log(step) + batch_log_weights_K,
+                    )
+
+            logger.debug("mini-batch ll per instance at EM iteration %i is %f", i, ll / batch_size)
 
         # compute new components
-        responsibilities_KN = numpy.exp(log_responsibilities_KN)
+        responsibilities_KX = numpy.exp(log_responsibilities_KX)
+        scale = N / float(responsibilities_KX.shape[1])
 
-        for k in xrange(K):
-            for s in xrange(S):
-                if alpha is None:
-                    dcm_estimate_ml_wallach_raw(components_KSD[k, s, :], counts_NSD[:, s, :], responsibilities_KN[k])
+        if alpha is None:
+            # histograms are shared by every update of a given solver
+            appearances_SKMD *= 1.0 - step
+            appearances_SKL *= 1.0 - step
 
-                    components_KSD[k, s, :] += 1e-16
+            for s in xrange(S):
+                if batch_X is None:
+                    (appearances_KMD, appearances_KL) = statistics_S[s].get_histograms(responsibilities_KX)
                 else:
-                    # fast approximation to fixed-alpha Dirichlet estimation
-                    components_KSD[k, s, :] = numpy.sum((counts_NSD[:, s, :] + 1e-4) * responsibilities_KN[k, :, None], axis = 0)
-                    components_KSD[k, s, :] *= alpha / numpy.sum(components_KSD[k, s, :])
+                    (appearances_KMD, appearances_KL) = \
+                        DCMStatistics(counts_NSD[batch_X, s, :], M, L) \
+                            .get_histograms(responsibilities_KX)
+
+                appearances_SKMD[s] += (step * scale) * appearances_KMD
+                appearances_SKL[s] += (step * scale) * appearances_KL
+
+            for j in prange(K * S, nogil = True, num_threads = threads, schedule = "dynamic"):
+                dcm_estimate_ml_wallach_fixed_point(
+                    D,
+                    M,
+                    L,
+                    &components_KSD[j / S, j % S, 0], components_KSD_stride2,
+                    &appearances_SKMD[j % S, j / S, 0, 0],
+                    &appearances_SKL[j % S, j / S, 0],
+                    )
+
+            components_KSD += 1e-16
+        else:
+            # fast approximation to fixed-alpha Dirichlet estimation
+            counts_XSD = counts_NSD if batch_X is None else counts_NSD[batch_X]
+            totals_KSD *= 1.0 - step
+            totals_KSD += (step * scale) * numpy.tensordot(responsibilities_KX, counts_XSD + 1e-4, axes = 1)
+
+            components_KSD[...] = totals_KSD * (alpha / numpy.sum(totals_KSD, axis = -1))[..., None]
+
+        if batch_X is None:
+            driver.checkpoint(
+                i,
+                components = components_KSD,
+                log_weights = log_weights_K,
+                log_responsibilities = log_responsibilities_KN,
+                )
+        elif alpha is None:
+            driver.checkpoint(
+                i,
+                components = components_KSD,
+                log_weights = log_weights_K,
+                stream = stream,
+                appearances_SKMD = appearances_SKMD,
+                appearances_SKL = appearances_SKL,
+                )
+        else:
+            driver.checkpoint(
+                i,
+                components = components_KSD,
+                log_weights = log_weights_K,
+                stream = stream,
+                totals = totals_KSD,
+                )
+
+    if batch_size is not None:
+        # a final, full E step
+        for u in prange(U, nogil = True, num_threads = threads, schedule = "static"):
+            for k in xrange(K):
+                log_density = 0.0
+
+                for s in xrange(S):
+                    log_density = log_density + \
+                        dcm_log_pdf_raw(
+                            D,
+                            &components_KSD[k, s, 0], components_KSD_stride2,
+                            &counts_USD[u, s, 0], counts_USD_stride2,
+                            )
+
+                log_densities_KU[k, u] = log_density
+
+        log_responsibilities_KN = log_densities_KU[:, inverse_N] + log_weights_K[..., None]
+        log_responsibilities_KN -= numpy.logaddexp.reduce(log_responsibilities_KN, axis = 0)
 
     assert numpy.all(numpy.isfinite(components_KSD))
     assert_log_weights(log_responsibilities_KN, axis = 0)
@@ -1168,100 +2130,187 @@ def dcm_matrix_mixture_estimate_ml(counts, int K, alpha = None):
     return (components_KSD, log_responsibilities_KN)
 
 @cython.cdivision(True)
-@cython.wraparound(False)
-@cython.boundscheck(False)
-@cython.infer_types(True)
-cdef numpy.ndarray discretize_log_normal(int D, double mu, double sigma, double theta, double terminus):
-    """Prepare a discretized distribution."""
+cdef void discretize_log_normal_raw(
+    int D,
+    double mu,
+    double sigma,
+    double theta,
+    double terminus,
+    double* ps_D,
+    ) nogil:
+    """Prepare a discretized distribution, in place."""
 
-    cdef numpy.ndarray[double, ndim = 1] ps_D = numpy.empty(D)
     cdef double interval = terminus / (D - 1)
+    cdef double below = log_normal_log_cdf(mu, sigma, theta, 0.0)
+    cdef double above
     cdef double total = 0.0
     cdef int d
 
+    # each bin edge's CDF is shared by the bins on either side
     for d in xrange(D):
-        below = \
-            log_normal_log_cdf(
-                mu,
-                sigma,
-                theta,
-                d * interval,
-                )
-
         if d == D - 1:
             above = 0.0
         else:
-            above = \
-                log_normal_log_cdf(
-                    mu,
-                    sigma,
-                    theta,
-                    (d + 1) * interval,
-                    )
+            above = log_normal_log_cdf(mu, sigma, theta, (d + 1) * interval)
 
         ps_D[d] = libc.math.exp(log_minus(above, below)) + 1e-8
 
         total += ps_D[d]
+        below = above
 
     for d in xrange(D):
         ps_D[d] /= total
 
-    return ps_D
+@cython.boundscheck(False)
+def discretize_log_normals(mus, sigmas, thetas, int D, double terminus, out = None, int threads = 1):
+    """
+    Prepare many discretized distributions at once.
+
+    Parameter arrays of a common shape yield bin probabilities of that shape
+    plus a trailing bin axis, written into out if it is given.
+    """
+
+    cdef numpy.ndarray[double, ndim = 1] mus_X = numpy.ascontiguousarray(mus, numpy.double).reshape(-1)
+    cdef numpy.ndarray[double, ndim = 1] sigmas_X = numpy.ascontiguousarray(sigmas, numpy.double).reshape(-1)
+    cdef numpy.ndarray[double, ndim = 1] thetas_X = numpy.ascontiguousarray(thetas, numpy.double).reshape(-1)
+
+    shape = numpy.shape(mus) + (D,)
+
+    assert numpy.shape(sigmas) == numpy.shape(mus)
+    assert numpy.shape(thetas) == numpy.shape(mus)
+
+    if out is None:
+        out = numpy.empty(shape, numpy.double)
+    else:
+        assert out.shape == shape
+        assert out.dtype == numpy.double
+        assert out.flags.c_contiguous
+
+    cdef numpy.ndarray[double, ndim = 2] ps_XD = out.reshape((mus_X.shape[0], D))
+    cdef int x
+
+    for x in prange(mus_X.shape[0], nogil = True, num_threads = threads, schedule = "static"):
+        discretize_log_normal_raw(D, mus_X[x], sigmas_X[x], thetas_X[x], terminus, &ps_XD[x, 0])
+
+    return out
 
 cdef class DiscreteLogNormalObjective(object):
     """Weighted data l-l under a discretized right-censored log-normal distribution."""
 
-    cdef numpy.ndarray _counts
+    cdef numpy.ndarray _totals
+    cdef numpy.ndarray _log_cdfs_E
+    cdef numpy.ndarray _cdf_gradients_E3
+    cdef numpy.ndarray _qs_D
     cdef double _terminus
-    cdef numpy.ndarray _log_responsibilities
-    cdef int _N
+    cdef double _constant
     cdef int _D
 
     def __init__(self, counts, terminus, log_responsibilities):
-        self._counts = counts
+        # the l-l depends on the data only through weighted bin totals
+        counts_ND = numpy.asarray(counts, numpy.double)
+        weights_N = numpy.exp(log_responsibilities)
+
+        self._totals = numpy.dot(weights_N, counts_ND)
         self._terminus = terminus
-        self._log_responsibilities = log_responsibilities
-        self._N = counts.shape[0]
-        self._D = counts.shape[1]
+        self._constant = \
+            numpy.dot(
+                weights_N,
+                scipy.special.gammaln(1.0 + numpy.sum(counts_ND, axis = -1))
+                - numpy.sum(scipy.special.gammaln(1.0 + counts_ND), axis = -1),
+                )
+        self._D = counts_ND.shape[1]
+
+        # scratch space, reused across evaluations
+        self._log_cdfs_E = numpy.empty(self._D + 1)
+        self._cdf_gradients_E3 = numpy.empty((self._D + 1, 3))
+        self._qs_D = numpy.empty(self._D)
+
+    def objective(self, arguments):
+        """Compute the negative log likelihood."""
+
+        return self.objective_and_gradient(arguments)[0]
 
     @cython.cdivision(True)
     @cython.wraparound(False)
     @cython.boundscheck(False)
     @cython.infer_types(True)
-    def objective(self, arguments):
-        """Compute the log likelihood."""
+    def objective_and_gradient(self, arguments):
+        """Compute the negative log likelihood and its gradient in (mu, sigma, theta)."""
 
         cdef double mu = arguments[0]
         cdef double sigma = arguments[1]
         cdef double theta = arguments[2]
 
-        cdef numpy.ndarray[int, ndim = 2] counts_ND = self._counts
-        cdef numpy.ndarray[double, ndim = 1] log_responsibilities_N = self._log_responsibilities
-        cdef numpy.ndarray[double, ndim = 1] ps_D = \
-            discretize_log_normal(
-                self._D,
-                mu,
-                sigma,
-                theta,
-                self._terminus,
-                )
+        cdef int D = self._D
+        cdef double interval = self._terminus / (D - 1)
 
-        cdef double ll = 0.0
-        cdef int ps_D_stride0 = ps_D.strides[0]
-        cdef int counts_ND_stride1 = counts_ND.strides[1]
-
-        for n in xrange(self._N):
-            ll += \
-                libc.math.exp(log_responsibilities_N[n]) \
-                * multinomial_log_pmf_raw(
-                    self._D,
-                    &ps_D[0], ps_D_stride0,
-                    &counts_ND[n, 0], counts_ND_stride1,
-                    )
+        cdef numpy.ndarray[double, ndim = 1] totals_D = self._totals
+        cdef numpy.ndarray[double, ndim = 1] log_cdfs_E = self._log_cdfs_E
+        cdef numpy.ndarray[double, ndim = 2] cdf_gradients_E3 = self._cdf_gradients_E3
+        cdef numpy.ndarray[double, ndim = 1] qs_D = self._qs_D
+        cdef numpy.ndarray[double, ndim = 1] gradient_3 = numpy.zeros(3)
+
+        # the CDF, and its gradient, at each bin edge; the last edge is at infinity
+        cdef double x
+        cdef double v
+        cdef double density
+        cdef int e
+
+        for e in xrange(D):
+            x = e * interval
+            log_cdfs_E[e] = log_normal_log_cdf(mu, sigma, theta, x)
+
+            if x > theta:
+                v = (libc.math.log(x - theta) - mu) / sigma
+                density = libc.math.exp(standard_normal_log_pdf(v)) / sigma
+
+                cdf_gradients_E3[e, 0] = -density
+                cdf_gradients_E3[e, 1] = -density * v
+                cdf_gradients_E3[e, 2] = -density / (x - theta)
+            else:
+                cdf_gradients_E3[e, 0] = 0.0
+                cdf_gradients_E3[e, 1] = 0.0
+                cdf_gradients_E3[e, 2] = 0.0
+
+        log_cdfs_E[D] = 0.0
+        cdf_gradients_E3[D, 0] = 0.0
+        cdf_gradients_E3[D, 1] = 0.0
+        cdf_gradients_E3[D, 2] = 0.0
+
+        # the bin probabilities, as computed by discretize_log_normal_raw()
+        cdef double total = 0.0
+        cdef int d
 
-        return -ll
+        for d in xrange(D):
+            qs_D[d] = libc.math.exp(log_minus(log_cdfs_E[d + 1], log_cdfs_E[d])) + 1e-8
+            total += qs_D[d]
+
+        cdef double ll = self._constant
+        cdef double count_total = 0.0
+        cdef int j
 
-def discrete_log_normal_mixture_estimate_ml(counts, double terminus, int K):
+        for d in xrange(D):
+            ll += totals_D[d] * libc.math.log(qs_D[d] / total)
+            count_total += totals_D[d]
+
+            for j in xrange(3):
+                gradient_3[j] -= totals_D[d] * (cdf_gradients_E3[d + 1, j] - cdf_gradients_E3[d, j]) / qs_D[d]
+
+        # account for the normalization of the bin probabilities
+        for j in xrange(3):
+            gradient_3[j] += count_total * (cdf_gradients_E3[D, j] - cdf_gradients_E3[0, j]) / total
+
+        return (-ll, gradient_3)
+
+def discrete_log_normal_mixture_estimate_ml(
+    counts,
+    double terminus,
+    int K,
+    int iterations = 64,
+    double tolerance = 1e-8,
+    double relative_tolerance = 0.0,
+    checkpoint_path = None,
+    ):
     """Fit a discretized right-censored log-normal mixture using EM."""
 
     # mise en place
@@ -1289,11 +2338,27 @@ def discrete_log_normal_mixture_estimate_ml(counts, double terminus, int K):
     log_weights_K -= numpy.logaddexp.reduce(log_weights_K)
 
     # expectation maximization
-    cdef double previous_ll = -INFINITY
+    driver = \
+        EMDriver(
+            iterations,
+            tolerance,
+            relative_tolerance,
+            checkpoint_path,
+            identity = ["discrete_log_normal_mixture", counts_ND, terminus, K],
+            )
+
+    if driver.state is not None:
+        mus_K[:] = driver.state["mus"]
+        sigmas_K[:] = driver.state["sigmas"]
+        thetas_K[:] = driver.state["thetas"]
+        ps_KD[:] = driver.state["ps"]
+        log_weights_K = driver.state["log_weights"]
+        log_responsibilities_KN = driver.state["log_responsibilities"]
+
     cdef int ps_KD_stride1 = ps_KD.strides[1]
     cdef int counts_ND_stride1 = counts_ND.strides[1]
 
-    for i in xrange(64):
+    for i in driver:
         print ">>>>", i
 
         # compute new components (M step)
@@ -1306,9 +2371,8 @@ def discrete_log_normal_mixture_estimate_ml(counts, double terminus, int K):
                     )
             ((mus_K[k], sigmas_K[k], thetas_K[k]), _, _) = \
                 scipy.optimize.fmin_l_bfgs_b(
-                    ll.objective,
+                    ll.objective_and_gradient,
                     [mus_K[k], sigmas_K[k], thetas_K[k]],
-                    approx_grad = True,
                     bounds = [
                         (None, None),
                         (1e-4, None),
@@ -1319,9 +2383,9 @@ def discrete_log_normal_mixture_estimate_ml(counts, double terminus, int K):
             #print "@", k, "(mu = {0}; sigma = {1}; theta = {2})".format(mus_K[k], sigmas_K[k], thetas_K[k])
 
         # compute new responsibilities (E step)
-        for k in xrange(K):
-            ps_KD[k, :] = discretize_log_normal(D, mus_K[k], sigmas_K[k], thetas_K[k], terminus)
+        discretize_log_normals(mus_K, sigmas_K, thetas_K, D, terminus, out = ps_KD)
 
+        for k in xrange(K):
             for n in xrange(N):
                 log_densities_KN[k, n] = \
                     multinomial_log_pmf_raw(
@@ -1345,22 +2409,32 @@ def discrete_log_normal_mixture_estimate_ml(counts, double terminus, int K):
         ll_each = numpy.logaddexp.reduce(log_densities_KN, axis = 0)
         ll = numpy.sum(ll_each)
 
-        delta_ll = ll - previous_ll
-        previous_ll = ll
-
-        if delta_ll >= 0.0:
-            logger.debug("ll at EM iteration %i is %f", i, ll)
-
-            if delta_ll <= 1e-8:
-                break
-        else:
-            logger.warning("ll at EM iteration %i is %f <-- DECLINE", i, ll)
+        if driver.converged(i, ll):
+            break
 
         assert not numpy.isnan(ll)
 
+        driver.checkpoint(
+            i,
+            mus = mus_K,
+            sigmas = sigmas_K,
+            thetas = thetas_K,
+            ps = ps_KD,
+            log_weights = log_weights_K,
+            log_responsibilities = log_responsibilities_KN,
+            )
+
     return (ps_KD, log_responsibilities_KN)
 
-def discrete_log_normal_matrix_mixture_estimate_ml(counts, double terminus, int K):
+def discrete_log_normal_matrix_mixture_estimate_ml(
+    counts,
+    double terminus,
+    int K,
+    int iterations = 64,
+    double tolerance = 1e-8,
+    double relative_tolerance = 0.0,
+    checkpoint_path = None,
+    ):
     """Fit a discretized right-censored log-normal mixture using EM."""
 
     # mise en place
@@ -1370,7 +2444,7 @@ def discrete_log_normal_matrix_mixture_estimate_ml(counts, double terminus, int
 
     cdef int i
     cdef int k
-    cdef int n
+    cdef int u
     cdef int s
 
     # initialization
@@ -1380,7 +2454,13 @@ def discrete_log_normal_matrix_mixture_estimate_ml(counts, double terminus, int
     #cdef numpy.ndarray[double, ndim = 2] thetas_KS = numpy.zeros((K, S))
     cdef numpy.ndarray[double, ndim = 2] thetas_KS = numpy.random.rand(K, S) * terminus / 2.0
     cdef numpy.ndarray[double, ndim = 3] ps_KSD = numpy.empty((K, S, D))
-    cdef numpy.ndarray[double, ndim = 2] log_densities_KN = numpy.empty((K, N), numpy.double)
+
+    # densities depend only on the counts, so evaluate them once per distinct instance
+    (unique_counts, inverse_N) = unique_rows(counts_NSD)
+
+    cdef numpy.ndarray[int, ndim = 3] counts_USD = unique_counts
+    cdef numpy.ndarray[double, ndim = 2] log_densities_KU = numpy.empty((K, counts_USD.shape[0]), numpy.double)
+    cdef int U = counts_USD.shape[0]
 
     #log_responsibilities_KN = numpy.zeros((K, N)) - INFINITY
 
@@ -1400,26 +2480,44 @@ def discrete_log_normal_matrix_mixture_estimate_ml(counts, double terminus, int
     log_weights_K -= numpy.logaddexp.reduce(log_weights_K)
 
     # expectation maximization
-    cdef double previous_ll = -INFINITY
+    driver = \
+        EMDriver(
+            iterations,
+            tolerance,
+            relative_tolerance,
+            checkpoint_path,
+            identity = ["discrete_log_normal_matrix_mixture", counts_NSD, terminus, K],
+            )
+
+    if driver.state is not None:
+        mus_KS[:] = driver.state["mus"]
+        sigmas_KS[:] = driver.state["sigmas"]
+        thetas_KS[:] = driver.state["thetas"]
+        ps_KSD[:] = driver.state["ps"]
+        log_weights_K = driver.state["log_weights"]
+        log_responsibilities_KN = driver.state["log_responsibilities"]
+
     cdef int ps_KSD_stride2 = ps_KSD.strides[2]
-    cdef int counts_NSD_stride2 = counts_NSD.strides[2]
+    cdef int counts_USD_stride2 = counts_USD.strides[2]
 
-    for i in xrange(64):
+    for i in driver:
         # compute new responsibilities (E step)
-        log_densities_KN[:] = log_weights_K[..., None]
+        log_densities_KU[:] = log_weights_K[..., None]
+
+        discretize_log_normals(mus_KS, sigmas_KS, thetas_KS, D, terminus, out = ps_KSD)
 
         for k in xrange(K):
             for s in xrange(S):
-                ps_KSD[k, s, :] = discretize_log_normal(D, mus_KS[k, s], sigmas_KS[k, s], thetas_KS[k, s], terminus)
-
-                for n in xrange(N):
-                    log_densities_KN[k, n] += \
+                for u in xrange(U):
+                    log_densities_KU[k, u] += \
                         multinomial_log_pmf_raw(
                             D,
                             &ps_KSD[k, s, 0], ps_KSD_stride2,
-                            &counts_NSD[n, s, 0], counts_NSD_stride2,
+                            &counts_USD[u, s, 0], counts_USD_stride2,
                             )
 
+        log_densities_KN = log_densities_KU[:, inverse_N]
+
         log_responsibilities_KN = numpy.copy(log_densities_KN)
         log_responsibilities_KN -= numpy.logaddexp.reduce(log_responsibilities_KN, axis = 0)
 
@@ -1433,16 +2531,8 @@ def discrete_log_normal_matrix_mixture_estimate_ml(counts, double terminus, int
         ll_each = numpy.logaddexp.reduce(log_densities_KN, axis = 0)
         ll = numpy.sum(ll_each)
 
-        delta_ll = ll - previous_ll
-        previous_ll = ll
-
-        if delta_ll >= 0.0:
-            logger.debug("ll at EM iteration %i is %f", i, ll)
-
-            if delta_ll <= 1e-8:
-                break
-        else:
-            logger.warning("ll at EM iteration %i is %f <-- DECLINE", i, ll)
+        if driver.converged(i, ll):
+            break
 
         assert not numpy.isnan(ll)
 
@@ -1457,9 +2547,8 @@ def discrete_log_normal_matrix_mixture_estimate_ml(counts, double terminus, int
                         )
                 ((mus_KS[k, s], sigmas_KS[k, s], thetas_KS[k, s]), _, _) = \
                     scipy.optimize.fmin_l_bfgs_b(
-                        ll.objective,
+                        ll.objective_and_gradient,
                         [mus_KS[k, s], sigmas_KS[k, s], thetas_KS[k, s]],
-                        approx_grad = True,
                         bounds = [
                             (None, None),
                             (1e-4, None),
@@ -1469,5 +2558,15 @@ def discrete_log_normal_matrix_mixture_estimate_ml(counts, double terminus, int
 
                 #print "@", k, "(mu = {0}; sigma = {1}; theta = {2})".format(mus_K[k], sigmas_K[k], thetas_K[k])
 
+        driver.checkpoint(
+            i,
+            mus = mus_KS,
+            sigmas = sigmas_KS,
+            thetas = thetas_KS,
+            ps = ps_KSD,
+            log_weights = log_weights_K,
+            log_responsibilities = log_responsibilities_KN,
+            )
+
     return (ps_KSD, log_responsibilities_KN)
 
@@ -2,8 +2,14 @@
 
 import os.path
 import csv
+import json
+import time
+import hashlib
+import tempfile
 import itertools
+import contextlib
 import collections
+import multiprocessing
 import numpy
 import borg
 
@@ -26,37 +32,328 @@ class RunRecord(object):
     def __repr__(self):
         return repr((self.solver, self.budget, self.cost, self.success))
 
+class RunLists(collections.Mapping):
+    """Read-only mapping from instance ids to lists of run records."""
+
+    def __init__(self, run_data):
+        """Initialize."""
+
+        self._run_data = run_data
+
+    def __getitem__(self, id_):
+        return self._run_data.get_run_list(id_)
+
+    def __iter__(self):
+        return iter(self._run_data.ids)
+
+    def __len__(self):
+        return len(self._run_data)
+
+class FeatureVectors(collections.Mapping):
+    """Read-only mapping from instance ids to feature dictionaries."""
+
+    def __init__(self, run_data):
+        """Initialize."""
+
+        self._run_data = run_data
+
+    def __getitem__(self, id_):
+        return self._run_data.get_feature_vector(id_)
+
+    def __contains__(self, id_):
+        return id_ in self._run_data._feature_indices
+
+    def __iter__(self):
+        return iter(self._run_data._feature_ids)
+
+    def __len__(self):
+        return len(self._run_data._feature_ids)
+
 class RunData(object):
-    """Load and access portfolio training data."""
+    """
+    Load and access portfolio training data.
+
+    Runs are stored column-wise, as parallel arrays of instance and solver
+    indices, budgets, costs, and outcomes; instance ids and solver names are
+    interned into lookup tables. Feature values are stored as rows of a
+    single matrix, with a column per feature name.
+
+    Subsets returned by filter(), filter_features(), masked(), and the
+    only_*() methods are views: they share the run columns, feature matrix,
+    and lookup tables of their parent, selecting storage rows and columns by
+    index, and are copied only when modified.
+    """
 
-    def __init__(self, solver_names, common_budget = None):
+    _run_columns = ["_run_instances", "_run_solvers", "_run_budgets", "_run_costs", "_run_successes"]
+
+    def __init__(self, solver_names, common_budget = None, feature_dtype = numpy.double):
         """Initialize."""
 
         self.solver_names = solver_names
-        self.run_lists = {}
-        self.feature_vectors = {}
         self.common_budget = common_budget
-        self.common_features = None
+
+        self._instance_ids = []
+        self._instance_indices = {}
+        self._solver_ids = []
+        self._solver_indices = {}
+        self._run_count = 0
+        self._run_instances = numpy.empty(0, numpy.int32)
+        self._run_solvers = numpy.empty(0, numpy.int32)
+        self._run_budgets = numpy.empty(0, numpy.double)
+        self._run_costs = numpy.empty(0, numpy.double)
+        self._run_successes = numpy.empty(0, numpy.bool_)
+        self._run_rows = None
+        self._instance_codes = None
+        self._feature_ids = []
+        self._feature_indices = {}
+        self._feature_names = None
+        self._feature_columns = None
+        self._feature_count = 0
+        self._feature_values = numpy.empty((0, 0), feature_dtype)
+        self._cell_groups = None
+        self._instance_ranks = None
+        self._fingerprint = None
 
     def __len__(self):
         """Number of instances for which data are stored."""
 
-        return len(self.run_lists)
+        return len(self._instance_indices)
 
-    def add_run(self, id_, run):
-        """Add a run to these data."""
+    def __getstate__(self):
+        """Prepare for pickling, discarding unused storage."""
+
+        data = self._materialized()
+        state = dict(data.__dict__)
+
+        for name in self._run_columns:
+            state[name] = state[name][:data._run_count]
+
+        state["_feature_values"] = state["_feature_values"][:data._feature_count]
+        state["_cell_groups"] = None
+        state["_instance_ranks"] = None
+
+        return state
 
-        runs = self.run_lists.get(id_)
+    def _view(self, codes, rows = None):
+        """Return a view of these data restricted to some instances."""
 
-        if runs is None:
-            self.run_lists[id_] = [run]
+        codes = numpy.asarray(codes, numpy.intp)
+        fingerprint_parts = ["view", codes.tostring()]
+
+        if rows is None:
+            selected = numpy.zeros(len(self._instance_ids), numpy.bool_)
+
+            selected[codes] = True
+
+            rows = numpy.flatnonzero(selected[self._get_column("_run_instances")])
+
+            if self._run_rows is not None:
+                rows = self._run_rows[rows]
         else:
-            runs.append(run)
+            fingerprint_parts.append(rows.tostring())
 
-        if self.common_budget is None:
-            self.common_budget = run.budget
+        view = RunData(self.solver_names, self.common_budget)
+
+        view._instance_ids = self._instance_ids
+        view._instance_indices = dict((self._instance_ids[n], n) for n in codes)
+        view._instance_codes = codes
+        view._solver_ids = self._solver_ids
+        view._solver_indices = self._solver_indices
+        view._run_count = len(rows)
+        view._run_rows = rows
+
+        for name in self._run_columns:
+            setattr(view, name, getattr(self, name))
+
+        view._feature_ids = [id_ for id_ in view.ids if id_ in self._feature_indices]
+        view._feature_indices = dict((id_, self._feature_indices[id_]) for id_ in view._feature_ids)
+        view._feature_names = self._feature_names
+        view._feature_columns = self._feature_columns
+        view._feature_count = self._feature_count
+        view._feature_values = self._feature_values
+
+        if self._fingerprint is not None:
+            view._fingerprint = derive_fingerprint(self._fingerprint, *fingerprint_parts)
+
+        return view
+
+    def _view_block(self, begin, end):
+        """Return a view of the runs stored in a range of rows."""
+
+        assert self._run_rows is None
+
+        (codes, firsts) = numpy.unique(self._run_instances[begin:end], return_index = True)
+
+        return self._view(codes[numpy.argsort(firsts)], numpy.arange(begin, end))
+
+    def _materialize(self):
+        """Copy the runs selected by a view into private storage."""
+
+        if self._run_rows is None:
+            return
+
+        codes = self._instance_codes
+        rows = self._run_rows
+        recoded = numpy.empty(len(self._instance_ids), numpy.int32)
+
+        recoded[codes] = numpy.arange(len(codes))
+
+        self._run_instances = recoded[self._run_instances[rows]]
+
+        for name in self._run_columns[1:]:
+            setattr(self, name, numpy.array(getattr(self, name)[rows]))
+
+        self._instance_ids = [self._instance_ids[n] for n in codes]
+        self._instance_indices = dict((id_, n) for (n, id_) in enumerate(self._instance_ids))
+        self._solver_ids = list(self._solver_ids)
+        self._solver_indices = dict(self._solver_indices)
+
+        if self._feature_names is not None:
+            feature_rows = numpy.array([self._feature_indices[id_] for id_ in self._feature_ids], numpy.intp)
+            feature_columns = self._get_feature_columns()
+
+            self._feature_values = numpy.array(self._feature_values[feature_rows[:, None], feature_columns[None, :]])
+            self._feature_names = [self._feature_names[f] for f in feature_columns]
+
+        self._feature_ids = list(self._feature_ids)
+        self._feature_indices = dict((id_, r) for (r, id_) in enumerate(self._feature_ids))
+        self._feature_columns = None
+        self._feature_count = len(self._feature_ids)
+        self._run_rows = None
+        self._instance_codes = None
+        self._cell_groups = None
+        self._instance_ranks = None
+
+    def _materialized(self):
+        """Return these data, or a private copy if they are a view."""
+
+        if self._run_rows is None:
+            return self
         else:
-            assert run.budget == self.common_budget
+            data = RunData.__new__(RunData)
+
+            data.__dict__.update(self.__dict__)
+            data._materialize()
+
+            return data
+
+    def _get_column(self, name):
+        """Return the values of a run column in the visible rows."""
+
+        if self._run_rows is None:
+            return getattr(self, name)[:self._run_count]
+        else:
+            return getattr(self, name)[self._run_rows]
+
+    def _get_instance_codes(self):
+        """Return the interned indices of the visible instances."""
+
+        if self._instance_codes is None:
+            return numpy.arange(len(self._instance_ids))
+        else:
+            return self._instance_codes
+
+    def _get_feature_columns(self):
+        """Return the matrix columns of the visible features."""
+
+        if self._feature_columns is None:
+            return numpy.arange(len(self._feature_names))
+        else:
+            return self._feature_columns
+
+    def _intern_instance(self, id_):
+        """Return the index of an instance id, adding it if necessary."""
+
+        n = self._instance_indices.get(id_)
+
+        if n is None:
+            n = self._instance_indices[id_] = len(self._instance_ids)
+
+            self._instance_ids.append(id_)
+
+            self._instance_ranks = None
+
+        return n
+
+    def _intern_solver(self, solver):
+        """Return the index of a solver name, adding it if necessary."""
+
+        s = self._solver_indices.get(solver)
+
+        if s is None:
+            s = self._solver_indices[solver] = len(self._solver_ids)
+
+            self._solver_ids.append(solver)
+
+        return s
+
+    def _reserve_runs(self, count):
+        """Make room to store additional runs."""
+
+        self._materialize()
+
+        needed = self._run_count + count
+        capacity = self._run_costs.shape[0]
+
+        if needed > capacity:
+            capacity = max(needed, 2 * capacity, 64)
+
+            for name in self._run_columns:
+                column = getattr(self, name)
+                grown = numpy.empty(capacity, column.dtype)
+
+                grown[:self._run_count] = column[:self._run_count]
+
+                setattr(self, name, grown)
+
+        self._cell_groups = None
+        self._fingerprint = None
+
+    def _check_budgets(self, budgets):
+        """Verify that new runs share the common budget."""
+
+        if len(budgets) == 0:
+            return
+
+        if self.common_budget is None:
+            self.common_budget = budgets[0]
+
+        assert numpy.all(numpy.asarray(budgets) == self.common_budget)
+
+    def add_run(self, id_, run):
+        """Add a run to these data."""
+
+        self._check_budgets([run.budget])
+        self._reserve_runs(1)
+
+        r = self._run_count
+
+        self._run_instances[r] = self._intern_instance(id_)
+        self._run_solvers[r] = self._intern_solver(run.solver)
+        self._run_budgets[r] = run.budget
+        self._run_costs[r] = run.cost
+        self._run_successes[r] = run.success
+        self._run_count = r + 1
+
+    def add_run_columns(self, ids, solvers, budgets, costs, successes):
+        """Add many runs to these data, one sequence per run attribute."""
+
+        R = len(ids)
+
+        assert R == len(solvers) == len(budgets) == len(costs) == len(successes)
+
+        self._check_budgets(budgets)
+        self._reserve_runs(R)
+
+        begin = self._run_count
+        end = begin + R
+
+        self._run_instances[begin:end] = [self._intern_instance(i) for i in ids]
+        self._run_solvers[begin:end] = [self._intern_solver(s) for s in solvers]
+        self._run_budgets[begin:end] = budgets
+        self._run_costs[begin:end] = costs
+        self._run_successes[begin:end] = successes
+        self._run_count = end
 
     def add_runs(self, pairs):
         """Add runs to these data."""
@@ -67,99 +364,136 @@ class RunData(object):
     def add_feature_vector(self, id_, vector):
         """Add a feature vector to these data."""
 
-        assert id_ not in self.feature_vectors
+        assert id_ not in self._feature_indices
         assert isinstance(vector, collections.Mapping)
 
-        names = [k for k in vector if k != "cpu_cost"]
+        self._materialize()
 
-        if self.common_features is None:
-            self.common_features = sorted(names)
+        if self._feature_names is None:
+            self._feature_names = sorted(vector)
+            self._feature_values = numpy.empty((0, len(self._feature_names)), self._feature_values.dtype)
         else:
-            assert self.common_features == sorted(names)
+            # only the cost column may be missing, since some domains lack it
+            missing = set(self._feature_names) - set(vector) - set(["cpu_cost"])
+            unknown = set(vector) - set(self._feature_names) - set(["cpu_cost"])
 
-        self.feature_vectors[id_] = vector
+            if missing or unknown:
+                raise Exception(
+                    "features of {0} differ: missing {1}, unknown {2}".format(id_, sorted(missing), sorted(unknown)),
+                    )
 
-    def filter(self, *ids):
-        """Return a filtered set of run data."""
+            if "cpu_cost" in vector and "cpu_cost" not in self._feature_names:
+                self._add_feature_column("cpu_cost")
 
-        data = RunData(self.solver_names)
+        values = [[vector.get(name, numpy.nan) for name in self._feature_names]]
 
-        for id_ in ids:
-            for run in self.run_lists[id_]:
-                data.add_run(id_, run)
+        self._append_feature_rows([id_], values)
 
-            data.add_feature_vector(id_, self.feature_vectors[id_])
+    def _add_feature_column(self, name):
+        """Add a feature column, unknown for the vectors already stored."""
 
-        data.common_budget = self.common_budget
+        (capacity, F) = self._feature_values.shape
+        widened = numpy.empty((capacity, F + 1), self._feature_values.dtype)
 
-        return data
+        widened[:, :F] = self._feature_values
+        widened[:, F] = numpy.nan
+
+        self._feature_values = widened
+        self._feature_names = self._feature_names + [name]
+        self._fingerprint = None
+
+    def _append_feature_rows(self, ids, values_NF):
+        """Add rows to the feature matrix."""
+
+        begin = self._feature_count
+        end = begin + len(ids)
+        capacity = self._feature_values.shape[0]
+
+        if end > capacity:
+            grown = numpy.empty((max(end, 2 * capacity, 64), len(self._feature_names)), self._feature_values.dtype)
+
+            grown[:begin] = self._feature_values[:begin]
+
+            self._feature_values = grown
+
+        self._feature_values[begin:end] = values_NF
+
+        for (r, id_) in enumerate(ids, begin):
+            self._feature_indices[id_] = r
+
+        self._feature_ids.extend(ids)
+
+        self._feature_count = end
+        self._fingerprint = None
+
+    def filter(self, *ids):
+        """Return a filtered set of run data."""
+
+        return self._view([self._instance_indices[id_] for id_ in ids])
 
     def filter_features(self, names):
         """Return a set of run data with only the specified features."""
 
-        data = RunData(self.solver_names, self.common_budget)
-
-        data.run_lists = self.run_lists
+        data = self._view(self._get_instance_codes())
+        name_columns = dict((self._feature_names[f], f) for f in self._get_feature_columns())
 
-        for (id_, old_vector) in self.feature_vectors.iteritems():
-            new_vector = dict((k, old_vector[k]) for k in names)
+        data._feature_ids = list(self._feature_ids)
+        data._feature_indices = dict(self._feature_indices)
+        data._feature_columns = numpy.array(sorted(name_columns[k] for k in set(names)), numpy.intp)
+        data._fingerprint = None
 
-            data.add_feature_vector(id_, new_vector)
+        if self._fingerprint is not None:
+            data._fingerprint = derive_fingerprint(self._fingerprint, "features", repr(list(names)))
 
         return data
 
     def masked(self, mask):
         """Return a subset of the instances."""
 
-        return self.filter(*(id_ for (id_, m) in zip(self.ids, mask) if m))
+        return self._view(self._get_instance_codes()[numpy.asarray(mask, numpy.bool_)])
 
-    def only_successful(self):
-        """Return only instances on which some solver succeeded."""
+    def _view_flagged(self, flags):
+        """Return a view of the instances on which some run is flagged."""
 
-        data = RunData(self.solver_names)
+        counts = \
+            numpy.bincount(
+                self._get_column("_run_instances")[flags],
+                minlength = len(self._instance_ids),
+                )
+        codes = self._get_instance_codes()
 
-        for (id_, run_list) in self.run_lists.iteritems():
-            if any(run.success for run in run_list):
-                for run in run_list:
-                    data.add_run(id_, run)
+        return self._view(codes[counts[codes] > 0])
 
-                data.add_feature_vector(id_, self.feature_vectors[id_])
-
-        data.common_budget = self.common_budget
+    def only_successful(self):
+        """Return only instances on which some solver succeeded."""
 
-        return data
+        return self._view_flagged(self._get_column("_run_successes"))
 
     def only_nontrivial(self, threshold = 1.0):
         """Return only instances on which some solver succeeded."""
 
-        data = RunData(self.solver_names)
-
-        for (id_, run_list) in self.run_lists.iteritems():
-            if any(not run.success or run.cost > threshold for run in run_list):
-                for run in run_list:
-                    data.add_run(id_, run)
+        successes = self._get_column("_run_successes")
+        costs = self._get_column("_run_costs")
 
-                data.add_feature_vector(id_, self.feature_vectors[id_])
-
-        data.common_budget = self.common_budget
-
-        return data
+        return self._view_flagged(~successes | (costs > threshold))
 
     def only_nonempty(self):
         """Return only instances on which some solver succeeded."""
 
-        data = RunData(self.solver_names)
+        return self._view_flagged(numpy.ones(self._run_count, numpy.bool_))
 
-        for (id_, run_list) in self.run_lists.iteritems():
-            if len(run_list) > 0:
-                for run in run_list:
-                    data.add_run(id_, run)
+    def excluding(self, id_, solver):
+        """Return these data without one solver's runs on one instance."""
 
-                data.add_feature_vector(id_, self.feature_vectors[id_])
+        dropped = \
+            (self._get_column("_run_instances") == self._instance_indices[id_]) \
+            & (self._get_column("_run_solvers") == self._solver_indices.get(solver, -1))
+        rows = numpy.flatnonzero(~dropped)
 
-        data.common_budget = self.common_budget
+        if self._run_rows is not None:
+            rows = self._run_rows[rows]
 
-        return data
+        return self._view(self._get_instance_codes(), rows)
 
     def collect_systematic(self, counts):
         """Get a systematic subset of the data."""
@@ -203,14 +537,84 @@ class RunData(object):
     def runs_on(self, id_, solver):
         """Retrieve runs made by a solver on an instance."""
 
-        for run in self.run_lists[id_]:
-            if run.solver == solver:
-                yield run
+        for r in self._get_cell_rows(id_, solver):
+            yield self._get_run_record(r)
+
+    def sample_run_on(self, id_, solver):
+        """Draw a random run made by a solver on an instance, if any."""
+
+        rows = self._get_cell_rows(id_, solver)
+
+        if len(rows) == 0:
+            return None
+        else:
+            return self._get_run_record(rows[numpy.random.randint(len(rows))])
+
+    def _get_cell_groups(self):
+        """Return storage rows ordered by instance and solver, with cell offsets."""
+
+        if self._cell_groups is None:
+            S = len(self._solver_ids)
+            cells = self._get_column("_run_instances").astype(numpy.intp) * S + self._get_column("_run_solvers")
+            order = numpy.argsort(cells, kind = "mergesort")
+
+            if self._run_rows is not None:
+                order = self._run_rows[order]
+
+            offsets = numpy.zeros(len(self._instance_ids) * S + 1, numpy.intp)
+
+            numpy.cumsum(numpy.bincount(cells, minlength = len(offsets) - 1), out = offsets[1:])
+
+            self._cell_groups = (S, order, offsets)
+
+        return self._cell_groups
+
+    def _get_cell_rows(self, id_, solver):
+        """Return the storage rows of runs made by a solver on an instance."""
+
+        n = self._instance_indices[id_]
+        s = self._solver_indices.get(solver)
+        (S, order, offsets) = self._get_cell_groups()
+
+        if s is None or s >= S:
+            return order[:0]
+        else:
+            return order[offsets[n * S + s]:offsets[n * S + s + 1]]
+
+    def _get_run_record(self, r):
+        """Build a record of the run stored in some row."""
+
+        return \
+            RunRecord(
+                self._solver_ids[self._run_solvers[r]],
+                float(self._run_budgets[r]),
+                float(self._run_costs[r]),
+                bool(self._run_successes[r]),
+                )
+
+    def get_run_list(self, id_):
+        """Retrieve all runs made on an instance."""
+
+        n = self._instance_indices[id_]
+        (S, order, offsets) = self._get_cell_groups()
+        rows = numpy.sort(order[offsets[n * S]:offsets[(n + 1) * S]])
+
+        return [self._get_run_record(r) for r in rows]
 
     def get_feature_vector(self, id_):
         """Retrieve features of a task."""
 
-        return self.feature_vectors[id_]
+        values = self._feature_values[self._feature_indices[id_]]
+        vector = {}
+
+        for f in self._get_feature_columns():
+            name = self._feature_names[f]
+            value = float(values[f])
+
+            if not (name == "cpu_cost" and numpy.isnan(value)):
+                vector[name] = value
+
+        return vector
 
     def get_feature_vectors(self):
         """Retrieve features of all tasks."""
@@ -220,82 +624,167 @@ class RunData(object):
     def get_common_budget(self):
         """Retrieve the common run budget, if any."""
 
-        budget = None
-
-        for runs in self.run_lists.values():
-            for run in runs:
-                if budget is None:
-                    budget = run.budget
-                elif run.budget != budget:
-                    raise Exception("collected runs include multiple run budgets")
+        budgets = self._get_column("_run_budgets")
 
-        return budget
+        if self._run_count == 0:
+            return None
+        elif numpy.any(budgets != budgets[0]):
+            raise Exception("collected runs include multiple run budgets")
+        else:
+            return float(budgets[0])
 
     def get_run_count(self):
         """Return the number of runs stored."""
 
-        return sum(map(len, self.run_lists.values()))
+        return self._run_count
+
+    def get_fingerprint(self):
+        """Return a digest identifying the contents of these data."""
+
+        if self._fingerprint is None:
+            digest = hashlib.sha1()
+
+            if self._run_rows is None:
+                digest.update(repr((self._instance_ids, self._solver_ids, self.common_budget)))
+
+                for name in self._run_columns:
+                    digest.update(numpy.ascontiguousarray(getattr(self, name)[:self._run_count]).tostring())
+
+                digest.update(repr((self._feature_ids, self._feature_names, self._feature_values.dtype.str)))
+                digest.update(numpy.ascontiguousarray(self._feature_values[:self._feature_count]).tostring())
+            else:
+                self._update_view_digest(digest)
+
+            self._fingerprint = digest.hexdigest()
+
+        return self._fingerprint
+
+    def _update_view_digest(self, digest, block = 65536):
+        """Hash a view as a private copy would be hashed, a block of rows at a time."""
+
+        codes = self._instance_codes
+        rows = self._run_rows
+        recoded = numpy.empty(len(self._instance_ids), numpy.int32)
+
+        recoded[codes] = numpy.arange(len(codes))
+
+        digest.update(repr(([self._instance_ids[n] for n in codes], list(self._solver_ids), self.common_budget)))
+
+        for name in self._run_columns:
+            column = getattr(self, name)
+
+            for begin in xrange(0, len(rows), block):
+                values = column[rows[begin:begin + block]]
+
+                if name == "_run_instances":
+                    values = recoded[values]
+
+                digest.update(values.tostring())
+
+        feature_ids = list(self._feature_ids)
+
+        if self._feature_names is None:
+            digest.update(repr((feature_ids, None, self._feature_values.dtype.str)))
+            digest.update(numpy.ascontiguousarray(self._feature_values[:len(feature_ids)]).tostring())
+        else:
+            columns = self._get_feature_columns()
+            feature_rows = numpy.array([self._feature_indices[id_] for id_ in feature_ids], numpy.intp)
+
+            digest.update(repr((feature_ids, [self._feature_names[f] for f in columns], self._feature_values.dtype.str)))
+
+            for begin in xrange(0, len(feature_rows), block):
+                values = self._feature_values[feature_rows[begin:begin + block, None], columns[None, :]]
+
+                digest.update(values.tostring())
+
+    def _cached(self, kind, parameters, compute):
+        """Retrieve a derived array through the on-disk cache, if enabled."""
+
+        cache = get_array_cache()
+
+        if cache is None:
+            return compute()
+        else:
+            return cache.get((kind, self.get_fingerprint()) + parameters, compute)
 
     def to_features_array(self):
         """Retrieve feature values in an array."""
 
-        assert set(self.feature_vectors) == set(self.run_lists)
+        return self._cached("features", (), self._compute_features_array)
 
-        N = len(self.ids)
-        F = len(self.common_features)
+    def _compute_features_array(self):
+        """Build the array of feature values."""
 
-        feature_values_NF = numpy.empty((N, F), numpy.double)
+        assert set(self._feature_indices) == set(self._instance_indices)
 
-        for (n, instance_id) in enumerate(sorted(self.ids)):
-            features = self.feature_vectors[instance_id]
+        rows = numpy.array([self._feature_indices[id_] for id_ in sorted(self.ids)], numpy.intp)
+        columns = \
+            numpy.array(
+                [f for f in self._get_feature_columns() if self._feature_names[f] != "cpu_cost"],
+                numpy.intp,
+                )
 
-            for (f, name) in enumerate(self.common_features):
-                feature_values_NF[n, f] = features[name]
+        return numpy.array(self._feature_values[rows[:, None], columns[None, :]])
 
-        return feature_values_NF
+    def _get_instance_ranks(self):
+        """Return the position of each interned instance in sorted id order."""
 
-    def to_runs_array(self, solver_names):
-        """Return run durations as a partially-filled array."""
+        if self._instance_ranks is None:
+            order = sorted(self._get_instance_codes(), key = self._instance_ids.__getitem__)
+            ranks = numpy.empty(len(self._instance_ids), numpy.intp)
 
-        S = len(solver_names)
-        N = len(self.run_lists)
+            ranks.fill(-1)
 
-        # accumulate the success and failure counts
-        successes_NS = numpy.zeros((N, S), numpy.intc)
-        failures_NS = numpy.zeros((N, S), numpy.intc)
-        solver_names_S = list(solver_names)
-        instance_ids = sorted(self.run_lists)
+            ranks[order] = numpy.arange(len(order))
 
-        for (n, instance_id) in enumerate(instance_ids):
-            runs = self.run_lists[instance_id]
+            self._instance_ranks = ranks
 
-            for run in runs:
-                s = solver_names_S.index(run.solver)
+        return self._instance_ranks
 
-                if run.success:
-                    successes_NS[n, s] += 1
-                else:
-                    failures_NS[n, s] += 1
+    def _get_run_codes(self, solver_names):
+        """Return sorted-instance and solver-name indices of every run."""
 
-        R = numpy.max(successes_NS)
+        solver_name_index = dict((name, s) for (s, name) in enumerate(solver_names))
+        solver_codes = numpy.array([solver_name_index.get(name, -1) for name in self._solver_ids], numpy.intp)
+        run_solvers = self._get_column("_run_solvers")
+        ss = solver_codes[run_solvers]
 
-        # fill in run durations
-        durations_NSR = numpy.ones((N, S, R), numpy.double) * numpy.nan
+        if numpy.any(ss < 0):
+            name = self._solver_ids[run_solvers[numpy.argmin(ss)]]
+
+            raise ValueError("solver \"{0}\" is not in the solver list".format(name))
+
+        ns = self._get_instance_ranks()[self._get_column("_run_instances")]
+
+        return (ns, ss)
 
-        successes_NS[...] = 0
+    def to_runs_array(self, solver_names):
+        """Return run durations as a partially-filled array."""
+
+        S = len(solver_names)
+        N = len(self)
 
-        for (n, instance_id) in enumerate(instance_ids):
-            runs = self.run_lists[instance_id]
+        (ns, ss) = self._get_run_codes(solver_names)
+        successes = self._get_column("_run_successes")
+        costs = self._get_column("_run_costs")
 
-            for run in runs:
-                s = solver_names_S.index(run.solver)
+        # accumulate the success and failure counts
+        cells = ns * S + ss
+        successes_NS = numpy.bincount(cells[successes], minlength = N * S).astype(numpy.intc).reshape((N, S))
+        failures_NS = numpy.bincount(cells[~successes], minlength = N * S).astype(numpy.intc).reshape((N, S))
+
+        R = numpy.max(successes_NS)
 
-                if run.success:
-                    r = successes_NS[n, s]
+        # fill in run durations, in order of appearance within each cell
+        durations_NSR = numpy.ones((N, S, R), numpy.double) * numpy.nan
 
-                    durations_NSR[n, s, r] = run.cost
+        success_cells = cells[successes]
+        order = numpy.argsort(success_cells, kind = "mergesort")
+        sorted_cells = success_cells[order]
+        starts = numpy.searchsorted(sorted_cells, sorted_cells)
+        rs = numpy.arange(len(sorted_cells)) - starts
 
-                    successes_NS[n, s] = r + 1
+        durations_NSR.reshape((N * S, R))[sorted_cells, rs] = costs[successes][order]
 
         return (successes_NS, failures_NS, durations_NSR)
 
@@ -303,27 +792,27 @@ class RunData(object):
         """Return run durations as per-solver arrays."""
 
         S = len(self.solver_names)
-        N = len(self.run_lists)
-
-        times_lists = [[] for _ in xrange(S)]
-        ns_lists = [[] for _ in xrange(S)]
-        failures_NS = numpy.zeros((N, S), numpy.intc)
-        instance_ids = sorted(self.run_lists)
+        N = len(self)
 
-        for (n, instance_id) in enumerate(instance_ids):
-            runs = self.run_lists[instance_id]
+        (ns, ss) = self._get_run_codes(self.solver_names)
+        successes = self._get_column("_run_successes")
+        costs = self._get_column("_run_costs")
 
-            for run in runs:
-                s = self.solver_names.index(run.solver)
+        failures_NS = \
+            numpy.bincount(
+                (ns * S + ss)[~successes],
+                minlength = N * S,
+                ) \
+                .astype(numpy.intc) \
+                .reshape((N, S))
 
-                if run.success:
-                    times_lists[s].append(run.cost)
-                    ns_lists[s].append(n)
-                else:
-                    failures_NS[n, s] += 1
+        order = numpy.argsort(ns[successes], kind = "mergesort")
+        success_ns = ns[successes][order]
+        success_ss = ss[successes][order]
+        success_costs = costs[successes][order]
 
-        times_arrays = map(numpy.array, times_lists)
-        ns_arrays = map(numpy.array, ns_lists)
+        times_arrays = [success_costs[success_ss == s] for s in xrange(S)]
+        ns_arrays = [success_ns[success_ss == s] for s in xrange(S)]
 
         return (times_arrays, ns_arrays, failures_NS)
 
@@ -333,26 +822,38 @@ class RunData(object):
         if cutoff is None:
             cutoff = self.get_common_budget()
 
+        return \
+            self._cached(
+                "bins",
+                (tuple(solver_names), B, cutoff),
+                lambda: self._compute_bins_array(solver_names, B, cutoff),
+                )
+
+    def _compute_bins_array(self, solver_names, B, cutoff):
+        """Count run outcomes in each discretized duration bin."""
+
         S = len(solver_names)
-        N = len(self.run_lists)
+        N = len(self)
         C = B + 1
 
-        solver_name_index = list(solver_names)
-        outcomes_NSC = numpy.zeros((N, S, C), numpy.intc)
+        (ns, ss) = self._get_run_codes(solver_names)
+        successes = self._get_column("_run_successes")
+        costs = self._get_column("_run_costs")
         interval = cutoff / B
 
-        for (n, instance_id) in enumerate(sorted(self.run_lists)):
-            runs = self.run_lists[instance_id]
-
-            for run in runs:
-                s = solver_name_index.index(run.solver)
+        bs = numpy.empty(len(costs), numpy.intp)
+        finished = successes & (costs < cutoff)
 
-                if run.success and run.cost < cutoff:
-                    b = int(run.cost / interval)
+        bs[finished] = (costs[finished] / interval).astype(numpy.intp)
+        bs[~finished] = B
 
-                    outcomes_NSC[n, s, b] += 1
-                else:
-                    outcomes_NSC[n, s, B] += 1
+        outcomes_NSC = \
+            numpy.bincount(
+                (ns * S + ss) * C + bs,
+                minlength = N * S * C,
+                ) \
+                .astype(numpy.intc) \
+                .reshape((N, S, C))
 
         return outcomes_NSC
 
@@ -360,10 +861,36 @@ class RunData(object):
     def ids(self):
         """All associated instance ids."""
 
-        return self.run_lists.keys()
+        if self._instance_codes is None:
+            return list(self._instance_ids)
+        else:
+            return [self._instance_ids[n] for n in self._instance_codes]
+
+    @property
+    def run_lists(self):
+        """Mapping from instance ids to lists of runs."""
+
+        return RunLists(self)
+
+    @property
+    def feature_vectors(self):
+        """Mapping from instance ids to feature dictionaries."""
+
+        return FeatureVectors(self)
+
+    @property
+    def common_features(self):
+        """Sorted names of the features shared by every instance."""
+
+        if self._feature_names is None:
+            return None
+        elif self._feature_columns is None:
+            return [name for name in self._feature_names if name != "cpu_cost"]
+        else:
+            return [self._feature_names[f] for f in self._feature_columns if self._feature_names[f] != "cpu_cost"]
 
     @staticmethod
-    def from_roots(solver_names, tasks_roots, domain, suffix = ".runs.csv"):
+    def from_roots(solver_names, tasks_roots, domain, suffix = ".runs.csv", workers = 1):
         """Collect run data by scanning for tasks."""
 
         task_paths = []
@@ -371,94 +898,716 @@ class RunData(object):
         for tasks_root in tasks_roots:
             task_paths.extend(borg.util.files_under(tasks_root, domain.extensions))
 
-        return RunData.from_paths(solver_names, task_paths, domain, suffix)
+        return RunData.from_paths(solver_names, task_paths, domain, suffix, workers)
 
     @staticmethod
-    def from_paths(solver_names, task_paths, domain, suffix = ".runs.csv"):
-        """Collect run data from task paths."""
+    def from_paths(solver_names, task_paths, domain, suffix = ".runs.csv", workers = 1):
+        """
+        Collect run data from task paths.
 
+        With more than one worker, per-task CSV files are parsed concurrently
+        by a process pool; runs are merged in task path order regardless.
+        """
+
+        task_paths = list(task_paths)
         training = RunData(solver_names)
+        arguments = itertools.izip(task_paths, itertools.repeat(suffix))
+
+        if workers > 1:
+            pool = multiprocessing.Pool(workers)
+            loaded = pool.imap(read_task_csvs, arguments, chunksize = 16)
+        else:
+            pool = None
+            loaded = itertools.imap(read_task_csvs, arguments)
 
-        for path in task_paths:
-            # load run records
-            run_data = numpy.recfromcsv(path + suffix, usemask = True)
-            rows = run_data.tolist()
+        try:
+            started = last_logged = time.time()
 
-            if run_data.shape == ():
-                rows = [rows]
+            for (n, (path, run_columns, feature_dict)) in enumerate(loaded, 1):
+                (solvers, budgets, costs, successes) = run_columns
 
-            for (run_solver, run_budget, run_cost, run_succeeded, run_answer) in rows:
-                record = RunRecord(run_solver, run_budget, run_cost, run_succeeded)
+                training.add_run_columns([path] * len(solvers), solvers, budgets, costs, successes)
+                training.add_feature_vector(path, feature_dict)
 
-                training.add_run(path, record)
+                now = time.time()
 
-            # load feature data
-            feature_records = numpy.recfromcsv("{0}.features.csv".format(path))
-            feature_dict = dict(zip(feature_records.dtype.names, feature_records.tolist()))
+                if now - last_logged >= 10.0 or n == len(task_paths):
+                    logger.info(
+                        "read %i of %i tasks (%.1f tasks/s)",
+                        n,
+                        len(task_paths),
+                        n / max(now - started, 1e-6),
+                        )
 
-            training.add_feature_vector(path, feature_dict)
+                    last_logged = now
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
 
         return training
 
+    def to_binary_bundle(self, bundle_path, segments = None, ingested = None):
+        """Write these data as memory-mappable arrays and a JSON manifest."""
+
+        if self._run_rows is not None:
+            return self._materialized().to_binary_bundle(bundle_path, segments, ingested)
+
+        segments = [] if segments is None else segments
+        ingested = {} if ingested is None else ingested
+
+        if not os.path.exists(bundle_path):
+            os.mkdir(bundle_path)
+
+        logger.info("writing binary run data to %s", bundle_path)
+
+        # write the run columns
+        for name in self._run_columns:
+            column_path = os.path.join(bundle_path, get_bundle_column_name(name))
+
+            numpy.save(column_path, getattr(self, name)[:self._run_count])
+
+        # write the feature matrix
+        feature_ids = self._feature_ids
+        feature_names = self._feature_names
+
+        if feature_names is not None:
+            numpy.save(os.path.join(bundle_path, "features.npy"), self._feature_values[:self._feature_count])
+
+        # then, finally, the manifest
+        manifest = {
+            "format_version": 1,
+            "solver_names": self.solver_names,
+            "solver_ids": self._solver_ids,
+            "instance_ids": self._instance_ids,
+            "feature_ids": feature_ids,
+            "feature_names": feature_names,
+            "common_budget": self.common_budget,
+            "run_count": self._run_count,
+            "segments": segments,
+            "ingested": ingested,
+            "fingerprint": self.get_fingerprint(),
+            }
+
+        write_bundle_manifest(bundle_path, manifest)
+
+    def integrate(self, other):
+        """Integrate other run data into these data."""
+
+        other = other._materialized()
+
+        R = other._run_count
+
+        self._check_budgets(other._run_budgets[:R])
+        self._reserve_runs(R)
+
+        instance_codes = numpy.array(map(self._intern_instance, other._instance_ids), numpy.int32)
+        solver_codes = numpy.array(map(self._intern_solver, other._solver_ids), numpy.int32)
+
+        begin = self._run_count
+        end = begin + R
+
+        self._run_instances[begin:end] = instance_codes[other._run_instances[:R]]
+        self._run_solvers[begin:end] = solver_codes[other._run_solvers[:R]]
+        self._run_budgets[begin:end] = other._run_budgets[:R]
+        self._run_costs[begin:end] = other._run_costs[:R]
+        self._run_successes[begin:end] = other._run_successes[:R]
+        self._run_count = end
+
+        # and any new feature vectors
+        new_ids = [id_ for id_ in other._feature_ids if id_ not in self._feature_indices]
+
+        if len(new_ids) > 0:
+            if self._feature_names is None:
+                self._feature_names = list(other._feature_names)
+                self._feature_values = numpy.empty((0, len(self._feature_names)), other._feature_values.dtype)
+            else:
+                assert self.common_features == other.common_features
+
+            other_columns = dict((name, f) for (f, name) in enumerate(other._feature_names))
+            other_rows = numpy.array([other._feature_indices[id_] for id_ in new_ids], numpy.intp)
+            values_NF = numpy.empty((len(new_ids), len(self._feature_names)), self._feature_values.dtype)
+
+            for (f, name) in enumerate(self._feature_names):
+                if name in other_columns:
+                    values_NF[:, f] = other._feature_values[other_rows, other_columns[name]]
+                else:
+                    values_NF[:, f] = numpy.nan
+
+            self._append_feature_rows(new_ids, values_NF)
+
+    @staticmethod
+    def from_binary_bundle(bundle_path):
+        """
+        Map run data from arrays written by to_binary_bundle().
+
+        Runs in appended segments, if any, are read and integrated; only a
+        single-segment bundle remains entirely memory-mapped.
+        """
+
+        (run_data, manifest) = RunData._map_binary_bundle(bundle_path)
+
+        # integrate any appended segments
+        fingerprints = [run_data._fingerprint]
+
+        for segment_name in manifest.get("segments", []):
+            segment = RunData.from_binary_bundle(os.path.join(bundle_path, segment_name))
+
+            run_data.integrate(segment)
+
+            fingerprints.append(segment._fingerprint)
+
+        if len(fingerprints) > 1 and None not in fingerprints:
+            run_data._fingerprint = derive_fingerprint(*fingerprints)
+
+        return run_data
+
+    @staticmethod
+    def _map_binary_bundle(bundle_path):
+        """Map run data from a binary bundle, ignoring appended segments."""
+
+        logger.info("mapping binary run data from %s", bundle_path)
+
+        manifest = read_bundle_manifest(bundle_path)
+
+        def decoded(strings):
+            return [s.encode("utf-8") for s in strings]
+
+        run_data = RunData(decoded(manifest["solver_names"]), manifest["common_budget"])
+
+        # map the run columns
+        run_data._instance_ids = decoded(manifest["instance_ids"])
+        run_data._instance_indices = dict((id_, n) for (n, id_) in enumerate(run_data._instance_ids))
+        run_data._solver_ids = decoded(manifest["solver_ids"])
+        run_data._solver_indices = dict((name, s) for (s, name) in enumerate(run_data._solver_ids))
+        run_data._run_count = manifest["run_count"]
+
+        for name in RunData._run_columns:
+            column_path = os.path.join(bundle_path, get_bundle_column_name(name))
+
+            setattr(run_data, name, numpy.load(column_path, mmap_mode = "r"))
+
+        # map the features
+        if manifest["feature_names"] is not None:
+            feature_ids = decoded(manifest.get("feature_ids", manifest["instance_ids"]))
+            feature_names = decoded(manifest["feature_names"])
+            features_path = os.path.join(bundle_path, "features.npy")
+
+            run_data._feature_ids = feature_ids
+            run_data._feature_indices = dict((id_, r) for (r, id_) in enumerate(feature_ids))
+            run_data._feature_names = feature_names
+            run_data._feature_count = len(feature_ids)
+            run_data._feature_values = numpy.load(features_path, mmap_mode = "r")
+
+        if manifest.get("fingerprint") is not None:
+            run_data._fingerprint = str(manifest["fingerprint"])
+
+        return (run_data, manifest)
+
     @staticmethod
     def from_bundle(bundle_path):
-        """Collect run data from two CSV files."""
+        """Collect run data from a binary bundle or from two CSV files."""
+
+        if os.path.exists(os.path.join(bundle_path, "manifest.json")):
+            return RunData.from_binary_bundle(bundle_path)
 
         run_data = RunData(None)
 
         # load runs
-        runs_csv_path = os.path.join(bundle_path, "all_runs.csv.gz")
+        with open_csv_runs(bundle_path) as csv_reader:
+            run_data.add_run_columns(*read_csv_run_columns(csv_reader))
+
+        run_data.solver_names = sorted(run_data._solver_ids)
+
+        # load features
+        for (id_, feature_dict) in read_csv_feature_vectors(bundle_path):
+            run_data.add_feature_vector(id_, feature_dict)
+
+        if len(run_data.feature_vectors) > 0:
+            assert set(run_data.ids) == set(run_data.feature_vectors)
+
+        return run_data
+
+    @staticmethod
+    def iter_bundle(bundle_path, block_runs = 2**16):
+        """
+        Iterate over the runs in a bundle as a sequence of RunData blocks.
+
+        Each block holds at most block_runs runs, with the feature vectors of
+        their instances; runs on one instance may be split across blocks.
+        Binary bundles are read through memory maps, so only the current
+        block need be resident.
+        """
+
+        if os.path.exists(os.path.join(bundle_path, "manifest.json")):
+            manifest = read_bundle_manifest(bundle_path)
+            segment_names = manifest.get("segments", [])
+
+            paths = [bundle_path] + [os.path.join(bundle_path, n) for n in segment_names]
+            segments = [RunData._map_binary_bundle(path)[0] for path in paths]
+
+            # features may be stored in a later segment than their runs
+            feature_segments = {}
+
+            for segment in segments:
+                for id_ in segment._feature_ids:
+                    feature_segments.setdefault(id_, segment)
+
+            for segment in segments:
+                for begin in xrange(0, segment._run_count, block_runs):
+                    block = segment._view_block(begin, min(begin + block_runs, segment._run_count))
+
+                    for id_ in block.ids:
+                        if id_ not in block._feature_indices and id_ in feature_segments:
+                            block.add_feature_vector(id_, feature_segments[id_].get_feature_vector(id_))
+
+                    yield block
+        else:
+            feature_vectors = dict(read_csv_feature_vectors(bundle_path))
+
+            with open_csv_runs(bundle_path) as csv_reader:
+                while True:
+                    columns = read_csv_run_columns(csv_reader, block_runs)
+
+                    if len(columns[0]) == 0:
+                        break
+
+                    block = RunData(None)
+
+                    block.add_run_columns(*columns)
+
+                    block.solver_names = sorted(block._solver_ids)
+
+                    for id_ in block.ids:
+                        if id_ in feature_vectors:
+                            block.add_feature_vector(id_, feature_vectors[id_])
+
+                    yield block
+
+class RunDataSummary(object):
+    """
+    Run outcome counts accumulated from a stream of run data blocks.
+
+    Summaries provide the part of the RunData interface used to train simple
+    models and portfolios, such as MulEstimator and BaselinePortfolio, for
+    collections with too many runs to hold in memory. Outcomes are binned
+    only for bin counts requested in advance, against a single cutoff.
+    """
+
+    def __init__(self, bin_counts, solver_names = None, cutoff = None):
+        """Initialize."""
+
+        self.solver_names = solver_names
+        self.feature_vectors = {}
+        self.common_budget = None
+        self.common_features = None
+
+        self._cutoff = cutoff
+        self._instance_ids = []
+        self._instance_indices = {}
+        self._solver_ids = []
+        self._solver_indices = {}
+        self._counts = dict((B, numpy.zeros((0, 0, B + 1), numpy.intc)) for B in bin_counts)
+        self._run_counts = numpy.zeros(0, numpy.int_)
+        self._success_counts = numpy.zeros(0, numpy.int_)
+        self._success_costs = numpy.zeros(0, numpy.double)
+
+    def __len__(self):
+        """Number of instances for which data are summarized."""
+
+        return len(self._instance_ids)
+
+    def _grow(self, N, S):
+        """Make room for counts over more instances or solvers."""
+
+        (old_N, old_S) = self._counts.values()[0].shape[:2] if self._counts else (0, 0)
+
+        if N > old_N or S > old_S:
+            N_cap = max(N, 2 * old_N) if N > old_N else old_N
+
+            for (B, counts_NSC) in self._counts.items():
+                grown = numpy.zeros((N_cap, S, B + 1), numpy.intc)
+
+                grown[:old_N, :old_S] = counts_NSC
+
+                self._counts[B] = grown
+
+        for name in ["_run_counts", "_success_counts", "_success_costs"]:
+            column = getattr(self, name)
+
+            if S > len(column):
+                setattr(self, name, numpy.concatenate([column, numpy.zeros(S - len(column), column.dtype)]))
+
+    def add(self, block):
+        """Accumulate the runs in a block of run data."""
+
+        if block.get_run_count() == 0:
+            return
+
+        budget = block.get_common_budget()
+
+        if self.common_budget is None:
+            self.common_budget = budget
+        elif budget != self.common_budget:
+            raise Exception("collected runs include multiple run budgets")
+
+        if self._cutoff is None:
+            self._cutoff = budget
+
+        # intern instances and solvers
+        ids = sorted(block.ids)
+        names = list(block._solver_ids)
+
+        for id_ in ids:
+            if id_ not in self._instance_indices:
+                self._instance_indices[id_] = len(self._instance_ids)
+
+                self._instance_ids.append(id_)
+
+        for name in names:
+            if name not in self._solver_indices:
+                self._solver_indices[name] = len(self._solver_ids)
+
+                self._solver_ids.append(name)
+
+        self._grow(len(self._instance_ids), len(self._solver_ids))
+
+        ns = numpy.array([self._instance_indices[id_] for id_ in ids], numpy.intp)
+        ss = numpy.array([self._solver_indices[name] for name in names], numpy.intp)
+
+        # accumulate outcome counts
+        for (B, counts_NSC) in self._counts.iteritems():
+            counts_NSC[ns[:, None], ss[None, :]] += block._compute_bins_array(names, B, self._cutoff)
+
+        # and per-solver statistics
+        run_ss = ss[block._get_column("_run_solvers")]
+        successes = block._get_column("_run_successes")
+        S = len(self._solver_ids)
+
+        self._run_counts += numpy.bincount(run_ss, minlength = S)
+        self._success_counts += numpy.bincount(run_ss[successes], minlength = S)
+        self._success_costs += numpy.bincount(run_ss[successes], block._get_column("_run_costs")[successes], minlength = S)
+
+        # keep the features of new instances
+        for id_ in ids:
+            if id_ not in self.feature_vectors and id_ in block.feature_vectors:
+                self.feature_vectors[id_] = block.feature_vectors[id_]
+
+                if self.common_features is None:
+                    self.common_features = block.common_features
+
+    def get_common_budget(self):
+        """Retrieve the common run budget, if any."""
+
+        return self.common_budget
+
+    def get_run_count(self):
+        """Return the number of runs summarized."""
+
+        return int(numpy.sum(self._run_counts))
+
+    def get_solver_statistics(self):
+        """Return per-solver run counts, success counts, and mean success costs."""
+
+        statistics = {}
+
+        for (s, name) in enumerate(self._solver_ids):
+            successes = self._success_counts[s]
+            mean_cost = self._success_costs[s] / successes if successes > 0 else numpy.nan
+
+            statistics[name] = (int(self._run_counts[s]), int(successes), mean_cost)
+
+        return statistics
+
+    def to_bins_array(self, solver_names, B, cutoff = None):
+        """Return discretized run duration counts."""
+
+        if B not in self._counts:
+            raise ValueError("outcomes were not accumulated for {0} bins".format(B))
+        if cutoff is not None and cutoff != self._cutoff:
+            raise ValueError("outcomes were not accumulated for cutoff {0}".format(cutoff))
+
+        N = len(self._instance_ids)
+        counts_NSC = self._counts[B][:N]
+        order = sorted(xrange(N), key = self._instance_ids.__getitem__)
+
+        for (s, name) in enumerate(self._solver_ids):
+            if name not in solver_names and self._run_counts[s] > 0:
+                raise ValueError("solver \"{0}\" is not in the solver list".format(name))
+
+        outcomes_NSC = numpy.zeros((N, len(solver_names), B + 1), numpy.intc)
+
+        for (s, name) in enumerate(solver_names):
+            if name in self._solver_indices:
+                outcomes_NSC[:, s] = counts_NSC[order, self._solver_indices[name]]
+
+        return outcomes_NSC
+
+    def to_features_array(self):
+        """Retrieve feature values in an array."""
+
+        assert set(self.feature_vectors) == set(self._instance_ids)
+
+        ids = sorted(self._instance_ids)
+        feature_values_NF = numpy.empty((len(ids), len(self.common_features)), numpy.double)
+
+        for (n, id_) in enumerate(ids):
+            features = self.feature_vectors[id_]
+
+            for (f, name) in enumerate(self.common_features):
+                feature_values_NF[n, f] = features[name]
+
+        return feature_values_NF
+
+    @property
+    def ids(self):
+        """All associated instance ids."""
+
+        return list(self._instance_ids)
+
+    @staticmethod
+    def from_bundle(bundle_path, bin_counts, solver_names = None, cutoff = None, block_runs = 2**16):
+        """Summarize the runs in a bundle, one block at a time."""
+
+        summary = RunDataSummary(bin_counts, solver_names, cutoff)
+
+        for block in RunData.iter_bundle(bundle_path, block_runs):
+            summary.add(block)
+
+        if summary.solver_names is None:
+            summary.solver_names = sorted(summary._solver_ids)
+
+        logger.info("summarized %i runs on %i instances", summary.get_run_count(), len(summary))
+
+        return summary
+
+@contextlib.contextmanager
+def open_csv_runs(bundle_path):
+    """Open the run data CSV file of a bundle, checking its header."""
+
+    runs_csv_path = os.path.join(bundle_path, "all_runs.csv.gz")
+
+    logger.info("reading run data from %s", runs_csv_path)
+
+    with borg.util.openz(runs_csv_path) as csv_file:
+        csv_reader = csv.reader(csv_file)
+
+        columns = csv_reader.next()
+
+        if columns[:5] != ["instance", "solver", "budget", "cost", "succeeded"]:
+            raise Exception("unexpected columns in run data CSV file")
+
+        yield csv_reader
+
+def read_csv_run_columns(csv_reader, count = None):
+    """Read run attribute columns from (at most count) rows of a CSV file."""
+
+    (instances, solvers, budgets, costs, successes) = ([], [], [], [], [])
 
-        logger.info("reading run data from %s", runs_csv_path)
+    for (instance, solver, budget_str, cost_str, succeeded_str) in itertools.islice(csv_reader, count):
+        instances.append(instance)
+        solvers.append(solver)
+        budgets.append(float(budget_str))
+        costs.append(float(cost_str))
+        successes.append(succeeded_str.lower() == "true")
 
-        solver_names = set()
+    return (instances, solvers, budgets, costs, successes)
 
-        with borg.util.openz(runs_csv_path) as csv_file:
-            csv_reader = csv.reader(csv_file)
+def read_csv_feature_vectors(bundle_path):
+    """Iterate over the feature vectors in the features CSV file of a bundle."""
 
+    features_csv_path = os.path.join(bundle_path, "all_features.csv.gz")
+
+    logger.info("reading feature data from %s", features_csv_path)
+
+    with borg.util.openz(features_csv_path) as csv_file:
+        csv_reader = csv.reader(csv_file)
+
+        try:
             columns = csv_reader.next()
+        except StopIteration:
+            pass
+        else:
+            if columns[0] != "instance":
+                raise Exception("unexpected columns in features CSV file")
 
-            if columns[:5] != ["instance", "solver", "budget", "cost", "succeeded"]:
-                raise Exception("unexpected columns in run data CSV file")
-
-            for (instance, solver, budget_str, cost_str, succeeded_str) in csv_reader:
-                run_data.add_run(
-                    instance,
-                    RunRecord(
-                        solver,
-                        float(budget_str),
-                        float(cost_str),
-                        succeeded_str.lower() == "true",
-                        ),
-                    )
-                solver_names.add(solver)
+            for row in csv_reader:
+                yield (row[0], dict(zip(columns[1:], map(float, row[1:]))))
 
-        run_data.solver_names = sorted(solver_names)
+def read_task_csvs(arguments):
+    """Read the run records and feature vector of a single task."""
 
-        # load features
-        features_csv_path = os.path.join(bundle_path, "all_features.csv.gz")
+    (path, suffix) = arguments
+
+    # load run records
+    run_data = numpy.atleast_1d(numpy.recfromcsv(path + suffix, usemask = True))
+    run_columns = \
+        tuple(
+            numpy.asarray(run_data[name])
+            for name in ["solver", "budget", "cost", "succeeded"]
+            )
+
+    # load feature data
+    feature_records = numpy.recfromcsv("{0}.features.csv".format(path))
+    feature_dict = dict(zip(feature_records.dtype.names, feature_records.tolist()))
+
+    return (path, run_columns, feature_dict)
+
+def derive_fingerprint(*parts):
+    """Combine strings into a new data fingerprint."""
+
+    digest = hashlib.sha1()
+
+    for part in parts:
+        digest.update("{0}:".format(len(part)))
+        digest.update(part)
+
+    return digest.hexdigest()
+
+def get_array_cache():
+    """Return the configured on-disk array cache, if any."""
 
-        logger.info("reading feature data from %s", features_csv_path)
+    if borg.defaults.array_cache_path is None:
+        return None
+    else:
+        return ArrayCache(borg.defaults.array_cache_path, borg.defaults.array_cache_bytes)
 
-        with borg.util.openz(features_csv_path) as csv_file:
-            csv_reader = csv.reader(csv_file)
+class ArrayCache(object):
+    """
+    Size-bounded on-disk cache of derived arrays.
 
+    Arrays are stored as .npy files named by a digest of their key, so one
+    cache directory may be shared by many processes. Files are written
+    atomically, touched when read, and evicted least recently used first.
+    """
+
+    def __init__(self, cache_path, max_bytes = 2**30):
+        """Initialize."""
+
+        self._cache_path = cache_path
+        self._max_bytes = max_bytes
+
+        if not os.path.exists(cache_path):
+            try:
+                os.makedirs(cache_path)
+            except OSError:
+                if not os.path.isdir(cache_path):
+                    raise
+
+    def get(self, key, compute):
+        """Retrieve the array stored under a key, computing it if necessary."""
+
+        digest = hashlib.sha1(repr(key)).hexdigest()
+        array_path = os.path.join(self._cache_path, digest + ".npy")
+
+        try:
+            array = numpy.load(array_path)
+        except IOError:
+            pass
+        else:
             try:
-                columns = csv_reader.next()
-            except StopIteration:
+                os.utime(array_path, None)
+            except OSError:
                 pass
-            else:
-                if columns[0] != "instance":
-                    raise Exception("unexpected columns in features CSV file")
 
-                for row in csv_reader:
-                    feature_dict = dict(zip(columns[1:], map(float, row[1:])))
+            return array
 
-                    run_data.add_feature_vector(row[0], feature_dict)
+        array = compute()
 
-                assert set(run_data.run_lists) == set(run_data.feature_vectors)
+        self._store(array_path, array)
+        self._evict()
 
-        return run_data
+        return array
+
+    def memoize(self, call):
+        """Memoize an array-valued callable in this cache."""
+
+        def wrapper(*args, **kwargs):
+            def token(value):
+                if isinstance(value, RunData):
+                    return ("RunData", value.get_fingerprint())
+                else:
+                    return value
+
+            key = (
+                call.__module__,
+                call.__name__,
+                tuple(map(token, args)),
+                tuple((k, token(v)) for (k, v) in sorted(kwargs.iteritems())),
+                )
+
+            return self.get(key, lambda: call(*args, **kwargs))
+
+        return wrapper
+
+    def _store(self, array_path, array):
+        """Atomically write an array to the cache."""
+
+        (fd, partial_path) = tempfile.mkstemp(suffix = ".partial", dir = self._cache_path)
+
+        try:
+            with os.fdopen(fd, "wb") as partial_file:
+                numpy.save(partial_file, array)
+
+            os.rename(partial_path, array_path)
+        except:
+            os.unlink(partial_path)
+
+            raise
+
+    def _evict(self):
+        """Remove the least recently used arrays until the cache fits."""
+
+        entries = []
+
+        for name in os.listdir(self._cache_path):
+            if name.endswith(".npy"):
+                try:
+                    stat = os.stat(os.path.join(self._cache_path, name))
+                except OSError:
+                    continue
+
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for (_, size, _) in entries)
+
+        for (_, size, name) in sorted(entries):
+            if total <= self._max_bytes:
+                break
+
+            try:
+                os.unlink(os.path.join(self._cache_path, name))
+            except OSError:
+                pass
+
+            total -= size
+
+def read_bundle_manifest(bundle_path):
+    """Read the manifest of a binary bundle."""
+
+    with open(os.path.join(bundle_path, "manifest.json"), "rb") as manifest_file:
+        manifest = json.load(manifest_file)
+
+    if manifest["format_version"] != 1:
+        raise Exception("unsupported binary bundle version")
+
+    return manifest
+
+def write_bundle_manifest(bundle_path, manifest):
+    """Atomically replace the manifest of a binary bundle."""
+
+    manifest_path = os.path.join(bundle_path, "manifest.json")
+    partial_path = manifest_path + ".partial"
+
+    with open(partial_path, "wb") as manifest_file:
+        json.dump(manifest, manifest_file)
+
+    os.rename(partial_path, manifest_path)
+
+def get_bundle_column_name(name):
+    """Return the file name of a run column in a binary bundle."""
+
+    return "runs.{0}.npy".format(name[len("_run_"):])
 
 TrainingData = RunData
 
@@ -0,0 +1,128 @@
+"""@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
+
+import os.path
+import nose.tools
+import borg
+import borg.tools.bundle_run_data
+
+def write_text(path, text, mode = "wb"):
+    """Write text to a file."""
+
+    with open(path, mode) as out_file:
+        out_file.write(text)
+
+def bundle_directory(root_path, bundle_path, only_solver = None):
+    """Incrementally bundle the data files in a directory."""
+
+    runs_paths = [os.path.join(root_path, "a.runs.csv")]
+    features_paths = [os.path.join(root_path, "a.features.csv")]
+
+    borg.tools.bundle_run_data.bundle_incrementally(
+        bundle_path,
+        runs_paths,
+        features_paths,
+        ".runs.csv",
+        ".features.csv",
+        only_solver,
+        )
+
+    return borg.storage.read_bundle_manifest(bundle_path)
+
+RUNS_TEXT = "solver,budget,cost,succeeded\nfoo,100.0,42.0,True\nbar,100.0,100.0,False\n"
+
+def make_directory(root_path):
+    """Write a small set of data files."""
+
+    write_text(os.path.join(root_path, "a.runs.csv"), RUNS_TEXT)
+    write_text(os.path.join(root_path, "a.features.csv"), "x,y\n1.0,2.0\n")
+
+def test_bundle_incrementally():
+    """Test borg.tools.bundle_run_data.bundle_incrementally()."""
+
+    with borg.util.mkdtemp_scoped() as root_path:
+        make_directory(root_path)
+
+        bundle_path = os.path.join(root_path, "bundle")
+        instance_path = os.path.join(root_path, "a")
+        runs_path = instance_path + ".runs.csv"
+
+        # the first build
+        manifest = bundle_directory(root_path, bundle_path)
+        run_data = borg.storage.RunData.from_bundle(bundle_path)
+
+        nose.tools.assert_equal(manifest["segments"], [])
+        nose.tools.assert_equal(run_data.get_run_count(), 2)
+        nose.tools.assert_equal(run_data.solver_names, ["bar", "foo"])
+        nose.tools.assert_equal(run_data.feature_vectors[instance_path], {"x": 1.0, "y": 2.0})
+
+        # unchanged files are skipped
+        manifest = bundle_directory(root_path, bundle_path)
+
+        nose.tools.assert_equal(manifest["segments"], [])
+
+        # appended rows, including a partial one, become a new segment
+        write_text(runs_path, "baz,100.0,7.0,True\nfoo,100.0,61.0,True\nbar,100", "ab")
+
+        manifest = bundle_directory(root_path, bundle_path)
+        run_data = borg.storage.RunData.from_bundle(bundle_path)
+
+        nose.tools.assert_equal(manifest["segments"], ["segment.0001"])
+        nose.tools.assert_equal(manifest["solver_names"], ["bar", "baz", "foo"])
+        nose.tools.assert_equal(run_data.get_run_count(), 4)
+        nose.tools.assert_equal(
+            sorted((run.solver, run.cost) for run in run_data.run_lists[instance_path]),
+            [("bar", 100.0), ("baz", 7.0), ("foo", 42.0), ("foo", 61.0)],
+            )
+        nose.tools.assert_equal(run_data.feature_vectors[instance_path], {"x": 1.0, "y": 2.0})
+
+        # the partial row is picked up once it is complete
+        write_text(runs_path, ".0,3.0,True\n", "ab")
+
+        manifest = bundle_directory(root_path, bundle_path)
+        run_data = borg.storage.RunData.from_bundle(bundle_path)
+
+        nose.tools.assert_equal(manifest["segments"], ["segment.0001", "segment.0002"])
+        nose.tools.assert_equal(run_data.get_run_count(), 5)
+
+def test_bundle_incrementally_errors():
+    """Test borg.tools.bundle_run_data.bundle_incrementally() on bad input."""
+
+    with borg.util.mkdtemp_scoped() as root_path:
+        make_directory(root_path)
+
+        bundle_path = os.path.join(root_path, "bundle")
+        runs_path = os.path.join(root_path, "a.runs.csv")
+
+        bundle_directory(root_path, bundle_path)
+
+        # a different solver restriction
+        nose.tools.assert_raises(Exception, bundle_directory, root_path, bundle_path, "foo")
+
+        # runs under a different budget
+        write_text(runs_path, "foo,200.0,42.0,True\n", "ab")
+
+        nose.tools.assert_raises(Exception, bundle_directory, root_path, bundle_path)
+
+        # a file that shrank
+        write_text(runs_path, "solver,budget,cost,succeeded\n")
+
+        nose.tools.assert_raises(Exception, bundle_directory, root_path, bundle_path)
+
+        # a features file that changed
+        write_text(runs_path, RUNS_TEXT)
+        write_text(os.path.join(root_path, "a.features.csv"), "x,y\n5.0,6.0\n")
+
+        nose.tools.assert_raises(Exception, bundle_directory, root_path, bundle_path)
+
+        # a directory that is not an incremental bundle
+        csv_path = os.path.join(root_path, "csv")
+
+        os.mkdir(csv_path)
+        write_text(os.path.join(csv_path, "all_runs.csv.gz"), "")
+
+        nose.tools.assert_raises(Exception, bundle_directory, root_path, csv_path)
+        nose.tools.assert_false(os.path.exists(os.path.join(csv_path, "manifest.json")))
+
+        manifest = borg.storage.read_bundle_manifest(bundle_path)
+
+    nose.tools.assert_equal(manifest["segments"], [])
@@ -27,6 +27,23 @@ def test_sampled_pmfs_log_pmf():
     nose.tools.assert_almost_equal(numpy.exp(logs[0, 1]), 0.9**2)
     nose.tools.assert_almost_equal(numpy.exp(logs[0, 2]), 0.1 * 0.9**2)
 
+def test_sampled_pmfs_mixture_log_pmf():
+    """Test borg.models.sampled_pmfs_mixture_log_pmf()."""
+
+    pmfs = numpy.log(numpy.random.dirichlet(numpy.ones(3), (5, 2)))
+    pmfs[0, 0, 1] = -numpy.inf
+    pmfs[0, 0] -= numpy.logaddexp.reduce(pmfs[0, 0])
+    counts = numpy.random.randint(0, 3, (4, 2, 3)).astype(numpy.intc)
+    counts[0, 0, 1] = 1
+    log_weights = numpy.log(numpy.random.dirichlet(numpy.ones(5), 4).T)
+
+    expected = numpy.logaddexp.reduce(borg.models.sampled_pmfs_log_pmf(pmfs, counts) + log_weights, axis = 0)
+
+    for (block, threads) in [(5, 1), (2, 1), (2, 3)]:
+        mixture = borg.models.sampled_pmfs_mixture_log_pmf(pmfs, counts, log_weights, block = block, threads = threads)
+
+        numpy.testing.assert_array_almost_equal(mixture, expected)
+
 def test_kernel_model_sample():
     """Test borg.models.KernelModel.sample()."""
 
@@ -88,3 +105,39 @@ def test_multinomial_model_condition():
     nose.tools.assert_almost_equal(posterior1.log_weights[0], numpy.log(0.1 * 0.5 / (0.1 * 0.5 + 0.8 * 0.5)))
     nose.tools.assert_almost_equal(posterior1.log_weights[1], numpy.log(0.8 * 0.5 / (0.1 * 0.5 + 0.8 * 0.5)))
 
+def test_multinomial_model_condition_weights():
+    """Test borg.models.MultinomialModel.condition_weights()."""
+
+    model = borg.models.MultinomialModel(10.0, numpy.log([[[0.2, 0.1]], [[0.9, 0.8]], [[0.5, 0.4]]]), numpy.log([0.2, 0.3, 0.5]))
+    log_weights = numpy.copy(model.log_weights)
+    returned = model.condition_weights(log_weights, 0, 0)
+
+    nose.tools.assert_true(returned is log_weights)
+
+    model.condition_weights(log_weights, 0, 1)
+
+    numpy.testing.assert_array_almost_equal(log_weights, model.condition([(0, 0), (0, 1)]).log_weights)
+    numpy.testing.assert_array_equal(model.log_weights, numpy.log([0.2, 0.3, 0.5]))
+
+def test_multinomial_model_compacted():
+    """Test borg.models.MultinomialModel.compacted()."""
+
+    log_survival = numpy.log([[[0.2, 0.1]], [[0.9, 0.8]], [[0.5, 0.4]], [[0.7, 0.6]]])
+    model = \
+        borg.models.MultinomialModel(
+            10.0,
+            log_survival,
+            numpy.log([0.002, 0.6, 0.001, 0.397]),
+            names = numpy.array(["a", "b", "c", "d"], object),
+            )
+    (compacted, kl_bound) = model.compacted(0.005)
+
+    numpy.testing.assert_array_equal(compacted.names, ["b", "d"])
+    numpy.testing.assert_array_equal(compacted.log_survival, log_survival[[1, 3]])
+    numpy.testing.assert_array_almost_equal(numpy.exp(compacted.log_weights), [0.6 / 0.997, 0.397 / 0.997])
+    nose.tools.assert_almost_equal(kl_bound, -numpy.log(0.997))
+
+    (same, kl_bound) = model.compacted(0.0)
+
+    nose.tools.assert_equal(same.log_weights.shape, (4,))
+    nose.tools.assert_equal(kl_bound, 0.0)
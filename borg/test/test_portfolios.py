@@ -0,0 +1,48 @@
+"""@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
+
+import cPickle as pickle
+import numpy
+import nose.tools
+import borg
+
+class UniformRegression(object):
+    """Predict uniform weights over model components."""
+
+    def __init__(self, W):
+        self._W = W
+
+    def predict(self, tasks, features):
+        return numpy.ones((len(tasks), self._W)) / self._W
+
+def test_pure_model_portfolio_unpickle_old():
+    """Test unpickling a PureModelPortfolio pickled before compaction."""
+
+    run_data = borg.RunData(["foo", "bar"])
+
+    run_data.add_run("a", borg.storage.RunRecord("foo", 100.0, 42.0, True))
+    run_data.add_run("a", borg.storage.RunRecord("bar", 100.0, 100.0, False))
+    run_data.add_feature_vector("a", {"x": 1.0, "cpu_cost": 1.0})
+
+    suite = borg.fake.FakeSuite(run_data)
+    samples_WSC = numpy.random.dirichlet(numpy.ones(11), (3, 2))
+    model = \
+        borg.models.MultinomialModel(
+            10.0,
+            borg.statistics.to_log_survival(samples_WSC, axis = -1),
+            log_masses = borg.statistics.floored_log(samples_WSC),
+            )
+    portfolio = \
+        borg.portfolios.PureModelPortfolio(
+            suite,
+            model,
+            UniformRegression(3),
+            planner = borg.planners.KnapsackPlanner(),
+            )
+
+    # mimic the state of a portfolio trained before compaction existed
+    del portfolio.__dict__["_compact"]
+
+    unpickled = pickle.loads(pickle.dumps(portfolio, protocol = -1))
+
+    nose.tools.assert_true(unpickled._compact is None)
+    nose.tools.assert_true(unpickled("a", suite, borg.Cost(cpu_seconds = 100.0)) in (True, None))
@@ -1,7 +1,10 @@
 """@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
 
+import os.path
+import cPickle as pickle
 import numpy
 import scipy.stats
+import scipy.optimize
 import scipy.special
 import nose.tools
 import borg
@@ -39,6 +42,108 @@ def test_unit_gamma_rv():
     yield (assert_unit_gamma_rv_ok, 1e+1)
     yield (assert_unit_gamma_rv_ok, 1e+2)
 
+def test_prng_stream():
+    stream = borg.statistics.PRNGStream(42)
+    uniforms = stream.uniform(65535)
+
+    nose.tools.assert_true(numpy.all(uniforms >= 0.0))
+    nose.tools.assert_true(numpy.all(uniforms < 1.0))
+    nose.tools.assert_almost_equal(numpy.mean(uniforms), 0.5, places = 2)
+    nose.tools.assert_equal(stream.counter, 65535)
+
+    numpy.testing.assert_array_equal(borg.statistics.PRNGStream(42).uniform(65535), uniforms)
+
+    (a, b) = stream.spawn(2)
+    (c,) = stream.spawn(1)
+
+    nose.tools.assert_false(numpy.any(a.uniform(64) == b.uniform(64)))
+    nose.tools.assert_false(numpy.any(a.uniform(64) == c.uniform(64)))
+
+    normals = stream.normal((256, 256))
+
+    nose.tools.assert_almost_equal(numpy.mean(normals), 0.0, places = 2)
+    nose.tools.assert_almost_equal(numpy.std(normals), 1.0, places = 2)
+
+    gammas = stream.gamma(numpy.tile([1e-1, 1e+1], 32768))
+
+    nose.tools.assert_almost_equal(numpy.mean(gammas[0::2]), 1e-1, places = 1)
+    nose.tools.assert_almost_equal(numpy.mean(gammas[1::2]) / 1e+1, 1.0, places = 1)
+
+    logps = numpy.log(numpy.tile([[0.2, 0.8]], (65535, 1)))
+    out = numpy.empty(65535, numpy.intc)
+
+    nose.tools.assert_true(stream.categorical_log(logps, out = out) is out)
+    nose.tools.assert_almost_equal(numpy.mean(out), 0.8, places = 2)
+
+def test_gamma_rvs():
+    shapes = numpy.tile([1e-1, 1e+0, 1e+1], (8192, 1))
+    rvs = borg.statistics.gamma_rvs(shapes, stream = borg.statistics.PRNGStream(42), threads = 4, block = 1000)
+
+    nose.tools.assert_equal(rvs.shape, shapes.shape)
+    numpy.testing.assert_array_almost_equal(numpy.mean(rvs, axis = 0) / [1e-1, 1e+0, 1e+1], numpy.ones(3), decimal = 1)
+
+    again = borg.statistics.gamma_rvs(shapes, stream = borg.statistics.PRNGStream(42), threads = 1, block = 1000)
+
+    numpy.testing.assert_array_equal(again, rvs)
+
+def test_dirichlet_rvs():
+    alpha = numpy.array([[1.0, 2.0, 7.0], [5e-1, 5e-1, 5e-1]])
+    out = numpy.empty((16384, 2, 3))
+    rvs = borg.statistics.dirichlet_rvs(alpha, 16384, out = out, threads = 4)
+
+    nose.tools.assert_true(rvs is out)
+    numpy.testing.assert_array_almost_equal(numpy.sum(rvs, axis = -1), numpy.ones((16384, 2)))
+    numpy.testing.assert_array_almost_equal(numpy.mean(rvs, axis = 0), alpha / numpy.sum(alpha, axis = -1)[:, None], decimal = 2)
+
+def test_prng_stream_pickle():
+    stream = borg.statistics.PRNGStream(42)
+
+    stream.normal(3)
+    stream.spawn(2)
+
+    unpickled = pickle.loads(pickle.dumps(stream, protocol = -1))
+
+    numpy.testing.assert_array_equal(unpickled.normal(5), stream.normal(5))
+    numpy.testing.assert_array_equal(unpickled.spawn(1)[0].uniform(4), stream.spawn(1)[0].uniform(4))
+
+def test_set_prng_seeds():
+    borg.statistics.set_prng_seeds(42)
+
+    before = [borg.statistics.unit_uniform_rv() for _ in xrange(8)]
+
+    borg.statistics.set_prng_seeds(42)
+
+    nose.tools.assert_equal([borg.statistics.unit_uniform_rv() for _ in xrange(8)], before)
+
+def test_logsumexp():
+    array = numpy.random.randn(7, 300, 5) * 10.0
+    array[:, 3, :] = -numpy.inf
+
+    for axis in [None, 0, 1, -1, (0, 1), (1, 2), (0, 2)]:
+        axes = tuple(range(array.ndim)) if axis is None else numpy.atleast_1d(axis)
+        expected = array
+
+        for a in sorted([a % array.ndim for a in axes], reverse = True):
+            expected = numpy.logaddexp.reduce(expected, axis = a)
+
+        numpy.testing.assert_array_almost_equal(borg.statistics.logsumexp(array, axis, threads = 3, block = 7), expected)
+
+def test_weighted_logsumexp():
+    array = numpy.random.randn(7, 300, 5)
+    log_weights = numpy.log(numpy.random.dirichlet(numpy.ones(7)))
+    expected = numpy.logaddexp.reduce(array + log_weights[:, None, None], axis = 0)
+
+    numpy.testing.assert_array_almost_equal(borg.statistics.weighted_logsumexp(array, log_weights, threads = 2, block = 11), expected)
+
+def test_logcumsumexp():
+    array = numpy.random.randn(4, 6)
+
+    numpy.testing.assert_array_almost_equal(borg.statistics.logcumsumexp(array, axis = 0), numpy.logaddexp.accumulate(array, axis = 0))
+    numpy.testing.assert_array_almost_equal(
+        borg.statistics.logcumsumexp(array, reverse = True),
+        numpy.logaddexp.accumulate(array[:, ::-1], axis = -1)[:, ::-1],
+        )
+
 def test_digamma():
     nose.tools.assert_almost_equal(borg.statistics.digamma(1e-2), scipy.special.digamma(1e-2))
     nose.tools.assert_almost_equal(borg.statistics.digamma(1e-1), scipy.special.digamma(1e-1))
@@ -307,3 +412,114 @@ def test_log_normal_mixture_estimate_ml():
     #with borg.util.numpy_errors(all = "raise"):
     yield (assert_ok, [0.0, 10.0], [1.0, 2.0], [0.0, 0.0], 1e4)
 
+def test_em_driver():
+    driver = borg.statistics.EMDriver(8, tolerance = 0.0, relative_tolerance = 1e-2)
+
+    nose.tools.assert_equal(list(driver), range(8))
+    nose.tools.assert_false(driver.converged(0, -100.0))
+    nose.tools.assert_false(driver.converged(1, -50.0))
+    nose.tools.assert_false(driver.converged(2, -60.0))
+    nose.tools.assert_true(driver.converged(3, -59.9))
+
+def test_warm_start_mixture():
+    components = numpy.ones((3, 2, 4))
+    initial_components = numpy.random.rand(2, 2, 4)
+    initial_log_responsibilities = numpy.log([[0.25, 0.5], [0.75, 0.5]])
+
+    log_weights = borg.statistics.warm_start_mixture(components, (initial_components, initial_log_responsibilities))
+
+    numpy.testing.assert_array_equal(components[:2], initial_components)
+    numpy.testing.assert_array_equal(components[2], 1.0)
+    numpy.testing.assert_array_almost_equal(numpy.exp(log_weights), [0.25, 5.0 / 12.0, 1.0 / 3.0])
+
+    with nose.tools.assert_raises(ValueError):
+        borg.statistics.warm_start_mixture(numpy.ones((1, 2, 4)), (initial_components, initial_log_responsibilities))
+
+def test_dcm_matrix_mixture_estimate_ml_resume():
+    counts = numpy.random.RandomState(1).randint(0, 4, (64, 2, 4)).astype(numpy.intc)
+
+    def fit(**kwargs):
+        numpy.random.seed(42)
+
+        return borg.statistics.dcm_matrix_mixture_estimate_ml(counts, 3, **kwargs)
+
+    (alphas, log_responsibilities) = fit()
+    old_interval = borg.defaults.em_checkpoint_interval
+
+    with borg.util.mkdtemp_scoped() as checkpoint_root:
+        checkpoint_path = os.path.join(checkpoint_root, "em.pickle")
+        borg.defaults.em_checkpoint_interval = 0.0
+
+        try:
+            fit(iterations = 2, checkpoint_path = checkpoint_path)
+
+            nose.tools.assert_true(os.path.exists(checkpoint_path))
+
+            (resumed_alphas, resumed_log_responsibilities) = fit(checkpoint_path = checkpoint_path)
+        finally:
+            borg.defaults.em_checkpoint_interval = old_interval
+
+    numpy.testing.assert_array_equal(resumed_alphas, alphas)
+    numpy.testing.assert_array_equal(resumed_log_responsibilities, log_responsibilities)
+
+    # a larger fit can start from a smaller one
+    (warm_alphas, warm_log_responsibilities) = \
+        borg.statistics.dcm_matrix_mixture_estimate_ml(counts, 4, initial = (alphas, log_responsibilities))
+
+    nose.tools.assert_equal(warm_alphas.shape, (4, 2, 4))
+    borg.statistics.assert_log_weights(warm_log_responsibilities, axis = 0)
+
+def test_dcm_matrix_mixture_estimate_ml_online():
+    counts = numpy.random.RandomState(1).randint(0, 4, (256, 2, 4)).astype(numpy.intc)
+
+    for alpha in [None, 2.0]:
+        (alphas, log_responsibilities) = \
+            borg.statistics.dcm_matrix_mixture_estimate_ml(
+                counts,
+                3,
+                alpha = alpha,
+                iterations = 16,
+                batch_size = 32,
+                )
+
+        nose.tools.assert_equal(alphas.shape, (3, 2, 4))
+        nose.tools.assert_equal(log_responsibilities.shape, (3, 256))
+        nose.tools.assert_true(numpy.all(alphas > 0.0))
+        borg.statistics.assert_log_weights(log_responsibilities, axis = 0)
+
+def test_discrete_log_normal_objective_gradient():
+    counts = numpy.random.RandomState(2).randint(0, 5, (32, 11)).astype(numpy.intc)
+    objective = borg.statistics.DiscreteLogNormalObjective(counts, 100.0, numpy.log(numpy.linspace(0.1, 1.0, 32)))
+
+    def assert_ok(arguments):
+        (value, gradient) = objective.objective_and_gradient(numpy.array(arguments))
+        approximate = \
+            scipy.optimize.approx_fprime(
+                numpy.array(arguments),
+                objective.objective,
+                1e-7,
+                )
+
+        nose.tools.assert_almost_equal(value, objective.objective(arguments))
+        numpy.testing.assert_allclose(gradient, approximate, rtol = 1e-3, atol = 1e-2)
+
+    yield (assert_ok, [3.0, 1.0, 5.0])
+    yield (assert_ok, [4.5, 2.0, 30.0])
+    yield (assert_ok, [2.0, 0.5, 0.0])
+
+def test_discretize_log_normals():
+    mus = numpy.random.rand(4, 3) * 3.0
+    sigmas = numpy.random.rand(4, 3) + 0.1
+    thetas = numpy.random.rand(4, 3)
+    out = numpy.empty((4, 3, 10))
+
+    nose.tools.assert_true(borg.statistics.discretize_log_normals(mus, sigmas, thetas, 10, 20.0, out = out, threads = 3) is out)
+
+    edges = numpy.arange(1, 10) * 20.0 / 9
+
+    for k in xrange(4):
+        for s in xrange(3):
+            cdfs = scipy.stats.lognorm.cdf(edges, sigmas[k, s], loc = thetas[k, s], scale = numpy.exp(mus[k, s]))
+            expected = numpy.diff(numpy.r_[0.0, cdfs, 1.0]) + 1e-8
+
+            numpy.testing.assert_array_almost_equal(out[k, s], expected / numpy.sum(expected))
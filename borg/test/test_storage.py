@@ -0,0 +1,399 @@
+"""@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
+
+import os.path
+import cPickle as pickle
+import numpy
+import nose.tools
+import borg
+
+def make_run_data():
+    """Build a small set of run data."""
+
+    run_data = borg.RunData(["foo", "bar"])
+
+    run_data.add_run("a", borg.storage.RunRecord("foo", 100.0, 42.0, True))
+    run_data.add_run("a", borg.storage.RunRecord("bar", 100.0, 100.0, False))
+    run_data.add_run("b", borg.storage.RunRecord("bar", 100.0, 7.0, True))
+    run_data.add_run("a", borg.storage.RunRecord("foo", 100.0, 61.0, True))
+    run_data.add_run("b", borg.storage.RunRecord("foo", 100.0, 100.0, False))
+
+    run_data.add_feature_vector("a", {"x": 1.0, "y": 2.0})
+    run_data.add_feature_vector("b", {"x": 3.0, "y": 4.0})
+
+    return run_data
+
+def test_run_data_runs_on():
+    """Test borg.storage.RunData.runs_on()."""
+
+    run_data = make_run_data()
+
+    nose.tools.assert_equal(len(run_data), 2)
+    nose.tools.assert_equal(run_data.get_run_count(), 5)
+    nose.tools.assert_equal(run_data.get_common_budget(), 100.0)
+    nose.tools.assert_equal([r.cost for r in run_data.runs_on("a", "foo")], [42.0, 61.0])
+    nose.tools.assert_equal([r.cost for r in run_data.runs_on("b", "bar")], [7.0])
+    nose.tools.assert_equal(list(run_data.runs_on("b", "baz")), [])
+    nose.tools.assert_equal(sorted(run_data.run_lists), ["a", "b"])
+    nose.tools.assert_equal([r.solver for r in run_data.run_lists["a"]], ["foo", "bar", "foo"])
+
+def test_run_data_sample_run_on():
+    """Test borg.storage.RunData.sample_run_on()."""
+
+    run_data = make_run_data()
+
+    costs = set(run_data.sample_run_on("a", "foo").cost for _ in xrange(64))
+
+    nose.tools.assert_equal(costs, set([42.0, 61.0]))
+    nose.tools.assert_equal(run_data.sample_run_on("b", "bar").cost, 7.0)
+    nose.tools.assert_equal(run_data.sample_run_on("b", "baz"), None)
+    nose.tools.assert_equal(run_data.filter("b").sample_run_on("b", "foo").cost, 100.0)
+
+    with nose.tools.assert_raises(KeyError):
+        run_data.sample_run_on("c", "foo")
+
+def test_run_data_to_bins_array():
+    """Test borg.storage.RunData.to_bins_array()."""
+
+    run_data = make_run_data()
+    bins = run_data.to_bins_array(["foo", "bar"], 2)
+
+    nose.tools.assert_equal(
+        bins.tolist(),
+        [
+            [[1, 1, 0], [0, 0, 1]],
+            [[0, 0, 1], [1, 0, 0]],
+            ],
+        )
+
+def test_run_data_filter():
+    """Test borg.storage.RunData.filter()."""
+
+    filtered = make_run_data().filter("b")
+
+    nose.tools.assert_equal(filtered.ids, ["b"])
+    nose.tools.assert_equal(filtered.get_run_count(), 2)
+    nose.tools.assert_equal(filtered.to_features_array().tolist(), [[3.0, 4.0]])
+
+def test_run_data_pickle():
+    """Test pickling of borg.storage.RunData."""
+
+    run_data = make_run_data()
+    unpickled = pickle.loads(pickle.dumps(run_data, protocol = -1))
+
+    numpy.testing.assert_array_equal(
+        unpickled.to_bins_array(["foo", "bar"], 4),
+        run_data.to_bins_array(["foo", "bar"], 4),
+        )
+
+    unpickled.add_run("c", borg.storage.RunRecord("foo", 100.0, 1.0, True))
+
+    nose.tools.assert_equal(unpickled.get_run_count(), 6)
+
+def test_run_data_binary_bundle():
+    """Test borg.storage.RunData.to_binary_bundle()."""
+
+    run_data = make_run_data()
+
+    with borg.util.mkdtemp_scoped() as bundle_path:
+        run_data.to_binary_bundle(bundle_path)
+
+        mapped = borg.storage.RunData.from_bundle(bundle_path)
+
+        nose.tools.assert_equal(mapped.ids, run_data.ids)
+        nose.tools.assert_equal(mapped.solver_names, run_data.solver_names)
+        nose.tools.assert_equal(mapped.common_budget, 100.0)
+        nose.tools.assert_equal(mapped.common_features, ["x", "y"])
+        nose.tools.assert_equal([r.cost for r in mapped.runs_on("a", "foo")], [42.0, 61.0])
+
+        numpy.testing.assert_array_equal(mapped.to_bins_array(["foo", "bar"], 4), run_data.to_bins_array(["foo", "bar"], 4))
+        numpy.testing.assert_array_equal(mapped.to_features_array(), run_data.to_features_array())
+
+        mapped.add_run("c", borg.storage.RunRecord("bar", 100.0, 3.0, True))
+
+        nose.tools.assert_equal(mapped.get_run_count(), 6)
+
+def test_run_data_integrate():
+    """Test borg.storage.RunData.integrate()."""
+
+    run_data = make_run_data()
+    other = borg.RunData(["baz"])
+
+    other.add_run("c", borg.storage.RunRecord("baz", 100.0, 5.0, True))
+    other.add_run("a", borg.storage.RunRecord("baz", 100.0, 9.0, False))
+    other.add_feature_vector("c", {"x": 5.0, "y": 6.0})
+
+    run_data.integrate(other)
+
+    nose.tools.assert_equal(run_data.ids, ["a", "b", "c"])
+    nose.tools.assert_equal(run_data.get_run_count(), 7)
+    nose.tools.assert_equal([r.cost for r in run_data.runs_on("a", "baz")], [9.0])
+    nose.tools.assert_equal(run_data.to_features_array().tolist(), [[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]])
+
+def test_run_data_views():
+    """Test views returned by borg.storage.RunData subset methods."""
+
+    run_data = make_run_data()
+    successful = run_data.masked([True, True]).only_successful()
+    nontrivial = run_data.only_nontrivial(50.0)
+
+    nose.tools.assert_equal(successful.ids, ["a", "b"])
+    nose.tools.assert_equal(nontrivial.ids, ["a", "b"])
+    nose.tools.assert_equal(run_data.only_nontrivial(200.0).ids, ["a", "b"])
+    nose.tools.assert_equal(run_data.masked([False, True]).ids, ["b"])
+    nose.tools.assert_equal(run_data.filter("a", "b").filter("a").get_run_count(), 3)
+
+    numpy.testing.assert_array_equal(
+        run_data.filter("b", "a").to_bins_array(["foo", "bar"], 2),
+        run_data.to_bins_array(["foo", "bar"], 2),
+        )
+
+    excluded = run_data.filter("b", "a").excluding("a", "foo")
+
+    nose.tools.assert_equal(excluded.ids, ["b", "a"])
+    nose.tools.assert_equal(excluded.get_run_count(), 3)
+    nose.tools.assert_equal([r.solver for r in excluded.run_lists["a"]], ["bar"])
+    nose.tools.assert_equal(excluded.feature_vectors["a"], {"x": 1.0, "y": 2.0})
+
+    view = run_data.filter("b")
+    unpickled = pickle.loads(pickle.dumps(view, protocol = -1))
+
+    nose.tools.assert_equal(unpickled.ids, ["b"])
+    nose.tools.assert_equal([r.cost for r in unpickled.run_lists["b"]], [7.0, 100.0])
+
+    view.add_run("c", borg.storage.RunRecord("foo", 100.0, 1.0, True))
+
+    nose.tools.assert_equal(view.ids, ["b", "c"])
+    nose.tools.assert_equal(view.get_run_count(), 3)
+    nose.tools.assert_equal(run_data.ids, ["a", "b"])
+    nose.tools.assert_equal(run_data.get_run_count(), 5)
+
+    with nose.tools.assert_raises(KeyError):
+        list(run_data.filter("a").runs_on("b", "foo"))
+
+def test_run_data_from_paths():
+    """Test borg.storage.RunData.from_paths()."""
+
+    with borg.util.mkdtemp_scoped() as tasks_path:
+        task_paths = [os.path.join(tasks_path, "task{0}.cnf".format(i)) for i in xrange(5)]
+
+        for (i, task_path) in enumerate(task_paths):
+            with open(task_path + ".runs.csv", "w") as runs_file:
+                runs_file.write("solver,budget,cost,succeeded,answer\n")
+
+                for j in xrange(i + 1):
+                    runs_file.write("foo,100.0,{0}.0,{1},\n".format(i + j, j % 2 == 0))
+
+            with open(task_path + ".features.csv", "w") as features_file:
+                features_file.write("x,y\n{0}.0,1.0\n".format(i))
+
+        serial = borg.RunData.from_paths(["foo"], task_paths, None)
+        parallel = borg.RunData.from_paths(["foo"], task_paths, None, workers = 2)
+
+        nose.tools.assert_equal(serial.ids, task_paths)
+        nose.tools.assert_equal(parallel.ids, task_paths)
+        nose.tools.assert_equal(parallel.get_run_count(), 15)
+        nose.tools.assert_equal([r.cost for r in parallel.runs_on(task_paths[2], "foo")], [2.0, 3.0, 4.0])
+
+        numpy.testing.assert_array_equal(parallel.to_bins_array(["foo"], 4), serial.to_bins_array(["foo"], 4))
+        numpy.testing.assert_array_equal(parallel.to_features_array(), serial.to_features_array())
+
+def test_run_data_fingerprint():
+    """Test borg.storage.RunData.get_fingerprint()."""
+
+    run_data = make_run_data()
+    fingerprint = run_data.get_fingerprint()
+
+    nose.tools.assert_equal(make_run_data().get_fingerprint(), fingerprint)
+    nose.tools.assert_equal(run_data.filter("b").get_fingerprint(), run_data.filter("b").get_fingerprint())
+    nose.tools.assert_not_equal(run_data.filter("b").get_fingerprint(), fingerprint)
+
+    with borg.util.mkdtemp_scoped() as bundle_path:
+        run_data.to_binary_bundle(bundle_path)
+
+        nose.tools.assert_equal(borg.storage.RunData.from_bundle(bundle_path).get_fingerprint(), fingerprint)
+
+    run_data.add_run("c", borg.storage.RunRecord("foo", 100.0, 1.0, True))
+
+    nose.tools.assert_not_equal(run_data.get_fingerprint(), fingerprint)
+
+def test_run_data_view_fingerprint():
+    """Test borg.storage.RunData.get_fingerprint() on views."""
+
+    run_data = make_run_data()
+
+    for view in [run_data.filter("b"), run_data.masked([True, False]), run_data.filter_features(["y"])]:
+        fingerprint = view.get_fingerprint()
+
+        # views are hashed in place, matching a private copy
+        nose.tools.assert_true(view._run_rows is not None)
+        nose.tools.assert_equal(view._materialized().get_fingerprint(), fingerprint)
+
+    nose.tools.assert_not_equal(run_data.filter("a").get_fingerprint(), run_data.filter("b").get_fingerprint())
+
+def test_array_cache():
+    """Test borg.storage.ArrayCache."""
+
+    with borg.util.mkdtemp_scoped() as cache_path:
+        cache = borg.storage.ArrayCache(cache_path, max_bytes = 1024)
+        calls = []
+
+        def compute(n):
+            calls.append(n)
+
+            return numpy.arange(n, dtype = numpy.intc)
+
+        cached = cache.memoize(compute)
+
+        numpy.testing.assert_array_equal(cached(4), numpy.arange(4))
+        numpy.testing.assert_array_equal(cached(4), numpy.arange(4))
+        nose.tools.assert_equal(calls, [4])
+
+        # storing a large array evicts the others
+        cached(1000)
+        cached(4)
+
+        nose.tools.assert_equal(calls, [4, 1000, 4])
+        nose.tools.assert_equal(cached(4).dtype, numpy.intc)
+
+def test_run_data_cached_bins():
+    """Test caching of borg.storage.RunData.to_bins_array()."""
+
+    run_data = make_run_data()
+    old_path = borg.defaults.array_cache_path
+
+    with borg.util.mkdtemp_scoped() as cache_path:
+        borg.defaults.array_cache_path = cache_path
+
+        try:
+            uncached = run_data._compute_bins_array(["bar", "foo"], 4, 100.0)
+
+            numpy.testing.assert_array_equal(run_data.to_bins_array(["bar", "foo"], 4), uncached)
+            numpy.testing.assert_array_equal(make_run_data().to_bins_array(["bar", "foo"], 4), uncached)
+            numpy.testing.assert_array_equal(run_data.to_features_array(), [[1.0, 2.0], [3.0, 4.0]])
+            nose.tools.assert_equal(len(os.listdir(cache_path)), 2)
+        finally:
+            borg.defaults.array_cache_path = old_path
+
+def test_run_data_summary_segments():
+    """Test borg.storage.RunDataSummary on features stored in a later segment."""
+
+    runs = borg.RunData(["foo"])
+
+    runs.add_run("a", borg.storage.RunRecord("foo", 100.0, 1.0, True))
+    runs.add_run("b", borg.storage.RunRecord("foo", 100.0, 2.0, True))
+    runs.add_feature_vector("a", {"x": 1.0})
+
+    features = borg.RunData(["foo"])
+
+    features.add_feature_vector("b", {"x": 2.0})
+
+    with borg.util.mkdtemp_scoped() as bundle_path:
+        runs.to_binary_bundle(bundle_path, segments = ["segment.0001"])
+        features.to_binary_bundle(os.path.join(bundle_path, "segment.0001"))
+
+        summary = borg.storage.RunDataSummary.from_bundle(bundle_path, [1])
+
+    nose.tools.assert_equal(sorted(summary.ids), ["a", "b"])
+    nose.tools.assert_equal(sorted(summary.feature_vectors), ["a", "b"])
+    nose.tools.assert_equal(summary.to_features_array().tolist(), [[1.0], [2.0]])
+
+def test_run_data_summary():
+    """Test borg.storage.RunDataSummary."""
+
+    run_data = make_run_data()
+
+    with borg.util.mkdtemp_scoped() as bundle_path:
+        with borg.util.openz(os.path.join(bundle_path, "all_runs.csv.gz"), "wb") as csv_file:
+            csv_file.write("instance,solver,budget,cost,succeeded\n")
+
+            for id_ in ["b", "a"]:
+                for run in run_data.run_lists[id_]:
+                    csv_file.write("{0},{1},{2},{3},{4}\n".format(id_, run.solver, run.budget, run.cost, run.success))
+
+        with borg.util.openz(os.path.join(bundle_path, "all_features.csv.gz"), "wb") as csv_file:
+            csv_file.write("instance,x,y\na,1.0,2.0\nb,3.0,4.0\n")
+
+        csv_summary = borg.storage.RunDataSummary.from_bundle(bundle_path, [1, 4], block_runs = 2)
+
+        with borg.util.mkdtemp_scoped() as binary_path:
+            run_data.to_binary_bundle(binary_path)
+
+            blocks = list(borg.storage.RunData.iter_bundle(binary_path, block_runs = 2))
+            binary_summary = borg.storage.RunDataSummary.from_bundle(binary_path, [1, 4], block_runs = 2)
+
+    nose.tools.assert_equal([block.get_run_count() for block in blocks], [2, 2, 1])
+    nose.tools.assert_equal(blocks[1].ids, ["b", "a"])
+
+    for summary in [csv_summary, binary_summary]:
+        nose.tools.assert_equal(sorted(summary.ids), ["a", "b"])
+        nose.tools.assert_equal(summary.solver_names, ["bar", "foo"])
+        nose.tools.assert_equal(summary.get_run_count(), 5)
+        nose.tools.assert_equal(summary.get_common_budget(), 100.0)
+        nose.tools.assert_equal(summary.get_solver_statistics()["foo"], (3, 2, 51.5))
+
+        for B in [1, 4]:
+            numpy.testing.assert_array_equal(
+                summary.to_bins_array(["foo", "bar"], B),
+                run_data.to_bins_array(["foo", "bar"], B),
+                )
+
+        numpy.testing.assert_array_equal(summary.to_features_array(), run_data.to_features_array())
+
+        with nose.tools.assert_raises(ValueError):
+            summary.to_bins_array(["foo"], 4)
+
+def test_run_data_feature_matrix():
+    """Test feature storage in borg.storage.RunData."""
+
+    run_data = borg.RunData(["foo"], feature_dtype = numpy.float32)
+
+    run_data.add_run("a", borg.storage.RunRecord("foo", 100.0, 1.0, True))
+    run_data.add_run("b", borg.storage.RunRecord("foo", 100.0, 2.0, True))
+    run_data.add_feature_vector("b", {"x": 3.0, "y": 4.0, "z": 5.0, "cpu_cost": 0.5})
+    run_data.add_feature_vector("a", {"x": 1.0, "y": 2.0, "z": 3.0, "cpu_cost": 0.25})
+
+    nose.tools.assert_equal(run_data.common_features, ["x", "y", "z"])
+    nose.tools.assert_equal(run_data.get_feature_vector("a"), {"x": 1.0, "y": 2.0, "z": 3.0, "cpu_cost": 0.25})
+    nose.tools.assert_equal(run_data.to_features_array().dtype, numpy.float32)
+    nose.tools.assert_equal(run_data.to_features_array().tolist(), [[1.0, 2.0, 3.0], [3.0, 4.0, 5.0]])
+
+    # select columns without copying the matrix
+    selected = run_data.filter_features(["z", "x"])
+
+    nose.tools.assert_true(selected._feature_values is run_data._feature_values)
+    nose.tools.assert_equal(selected.common_features, ["x", "z"])
+    nose.tools.assert_equal(selected.get_feature_vector("b"), {"x": 3.0, "z": 5.0})
+    nose.tools.assert_equal(selected.to_features_array().tolist(), [[1.0, 3.0], [3.0, 5.0]])
+    nose.tools.assert_equal(selected.filter_features(["z"]).to_features_array().tolist(), [[3.0], [5.0]])
+
+    with nose.tools.assert_raises(KeyError):
+        selected.filter_features(["y"])
+
+    # modifying a subset copies its features
+    subset = run_data.filter("a")
+
+    subset.add_run("c", borg.storage.RunRecord("foo", 100.0, 2.0, True))
+    subset.add_feature_vector("c", {"x": 7.0, "y": 8.0, "z": 9.0})
+
+    nose.tools.assert_equal(subset.to_features_array().tolist(), [[1.0, 2.0, 3.0], [7.0, 8.0, 9.0]])
+    nose.tools.assert_equal(subset.get_feature_vector("c"), {"x": 7.0, "y": 8.0, "z": 9.0})
+    nose.tools.assert_equal(sorted(run_data.feature_vectors), ["a", "b"])
+
+    # every vector must match the first one's names
+    with nose.tools.assert_raises(Exception):
+        subset.add_feature_vector("d", {"x": 7.0, "y": 8.0})
+
+    with nose.tools.assert_raises(Exception):
+        subset.add_feature_vector("d", {"x": 7.0, "y": 8.0, "z": 9.0, "w": 1.0})
+
+    uncosted = borg.RunData(["foo"])
+
+    uncosted.add_run("a", borg.storage.RunRecord("foo", 100.0, 1.0, True))
+    uncosted.add_run("b", borg.storage.RunRecord("foo", 100.0, 2.0, True))
+    uncosted.add_feature_vector("a", {"x": 1.0})
+    uncosted.add_feature_vector("b", {"x": 2.0, "cpu_cost": 0.5})
+
+    nose.tools.assert_equal(uncosted.common_features, ["x"])
+    nose.tools.assert_equal(uncosted.get_feature_vector("a"), {"x": 1.0})
+    nose.tools.assert_equal(uncosted.get_feature_vector("b"), {"x": 2.0, "cpu_cost": 0.5})
+    nose.tools.assert_equal(uncosted.to_features_array().tolist(), [[1.0], [2.0]])
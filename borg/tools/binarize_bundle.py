@@ -0,0 +1,21 @@
+"""@author: Bryan Silverthorn <bcs@cargo-cult.org>"""
+
+import borg
+
+logger = borg.get_logger(__name__, default_level = "INFO")
+
+@borg.annotations(
+    bundle_path = ("path to existing bundle",),
+    )
+def main(bundle_path):
+    """Add memory-mappable arrays to a CSV run data bundle."""
+
+    run_data = borg.storage.RunData.from_bundle(bundle_path)
+
+    run_data.to_binary_bundle(bundle_path)
+
+    logger.info("converted %i runs on %i instances", run_data.get_run_count(), len(run_data))
+
+if __name__ == "__main__":
+    borg.script(main)
+
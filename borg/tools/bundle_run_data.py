@@ -7,12 +7,150 @@ import borg
 
 logger = borg.get_logger(__name__, default_level = "INFO")
 
+def read_new_rows(path, offset):
+    """Read the complete CSV rows written to a file after some byte offset."""
+
+    with open(path, "rb") as in_file:
+        in_file.seek(offset)
+
+        text = in_file.read()
+
+    complete = text[:text.rfind("\n") + 1]
+
+    return (list(csv.reader(complete.splitlines())), offset + len(complete))
+
+def bundle_incrementally(
+    bundle_path,
+    runs_paths,
+    features_paths,
+    runs_extension,
+    features_extension,
+    only_solver,
+    ):
+    """Append data not yet bundled to a binary bundle, as a new segment."""
+
+    # determine what has already been bundled
+    if os.path.exists(os.path.join(bundle_path, "manifest.json")):
+        manifest = borg.storage.read_bundle_manifest(bundle_path)
+
+        if not manifest["ingested"]:
+            raise Exception("bundle was not built incrementally; rebuild it")
+    elif os.path.exists(bundle_path):
+        raise Exception("{0} exists but is not an incremental bundle".format(bundle_path))
+    else:
+        manifest = None
+
+    ingested = {} if manifest is None else manifest["ingested"]
+
+    if manifest is None:
+        ingested["only_solver"] = only_solver
+    elif ingested.get("only_solver") != only_solver:
+        raise Exception("bundle was built with a different solver restriction; rebuild it")
+
+    runs_ingested = ingested.setdefault("runs", {})
+    features_ingested = ingested.setdefault("features", {})
+
+    # collect new runs
+    segment = borg.storage.RunData(None)
+    solver_names = set()
+
+    for runs_path in runs_paths:
+        stat = os.stat(runs_path)
+        record = runs_ingested.get(runs_path, {"size": 0, "offset": 0, "mtime": None})
+
+        if stat.st_size == record["size"] and stat.st_mtime == record["mtime"]:
+            continue
+        elif stat.st_size < record["offset"]:
+            raise Exception("{0} shrank since it was bundled; rebuild the bundle".format(runs_path))
+
+        logger.info("reading %s from byte %i", runs_path, record["offset"])
+
+        (rows, offset) = read_new_rows(runs_path, record["offset"])
+
+        if record["offset"] == 0 and len(rows) > 0:
+            assert rows[0][:4] == ["solver", "budget", "cost", "succeeded"]
+
+            rows = rows[1:]
+
+        rows = [row for row in rows if only_solver is None or row[0] == only_solver]
+
+        segment.add_run_columns(
+            [runs_path[:-len(runs_extension)]] * len(rows),
+            [row[0] for row in rows],
+            [float(row[1]) for row in rows],
+            [float(row[2]) for row in rows],
+            [row[3].lower() == "true" for row in rows],
+            )
+
+        solver_names.update(row[0] for row in rows)
+
+        runs_ingested[runs_path] = {"size": stat.st_size, "offset": offset, "mtime": stat.st_mtime}
+
+    # collect new features
+    for features_path in features_paths:
+        stat = os.stat(features_path)
+        record = features_ingested.get(features_path)
+
+        if record is not None:
+            if stat.st_size == record["size"] and stat.st_mtime == record["mtime"]:
+                continue
+            else:
+                raise Exception("{0} changed since it was bundled; rebuild the bundle".format(features_path))
+
+        logger.info("reading %s", features_path)
+
+        with open(features_path) as in_file:
+            in_reader = csv.reader(in_file)
+            column_names = in_reader.next()
+
+            for row in in_reader:
+                segment.add_feature_vector(
+                    features_path[:-len(features_extension)],
+                    dict(zip(column_names, map(float, row))),
+                    )
+
+        features_ingested[features_path] = {"size": stat.st_size, "offset": stat.st_size, "mtime": stat.st_mtime}
+
+    # write the new segment
+    if segment.get_run_count() == 0 and len(segment.feature_vectors) == 0:
+        logger.info("no new run or feature data to bundle")
+
+        return
+
+    logger.info(
+        "bundling %i new runs and %i new feature vectors",
+        segment.get_run_count(),
+        len(segment.feature_vectors),
+        )
+
+    segment.solver_names = sorted(solver_names)
+
+    if manifest is None:
+        segment.to_binary_bundle(bundle_path, ingested = ingested)
+    else:
+        if segment.common_budget not in (None, manifest["common_budget"]):
+            raise Exception("new runs do not share the bundle's common budget")
+
+        segment_name = "segment.{0:04d}".format(len(manifest["segments"]) + 1)
+
+        segment.to_binary_bundle(os.path.join(bundle_path, segment_name))
+
+        manifest["segments"].append(segment_name)
+        manifest["solver_names"] = sorted(set(manifest["solver_names"]) | solver_names)
+
+        if manifest["common_budget"] is None:
+            manifest["common_budget"] = segment.common_budget
+
+        borg.storage.write_bundle_manifest(bundle_path, manifest)
+
 @borg.annotations(
     bundle_path = ("path to new bundle",),
     root_path = ("instances root directory",),
     runs_extension = ("runs files extension",),
     features_extension = ("features files extension",),
     only_solver = ("only include one solver's runs", "option"),
+    binary = ("also write memory-mappable arrays", "flag"),
+    incremental = ("append only new data to a binary bundle", "flag"),
     )
 def main(
     bundle_path,
@@ -20,6 +158,8 @@ def main(
     runs_extension = ".runs.csv",
     features_extension = ".features.csv",
     only_solver = None,
+    binary = False,
+    incremental = False,
     ):
     """Bundle together run and feature data."""
 
@@ -27,6 +167,18 @@ def main(
     runs_paths = map(os.path.abspath, borg.util.files_under(root_path, [runs_extension]))
     features_paths = map(os.path.abspath, borg.util.files_under(root_path, [features_extension]))
 
+    if incremental:
+        bundle_incrementally(
+            bundle_path,
+            runs_paths,
+            features_paths,
+            runs_extension,
+            features_extension,
+            only_solver,
+            )
+
+        return
+
     # write the bundle
     os.mkdir(bundle_path)
     csv.field_size_limit(1000 * 1000 * 1000)
@@ -79,6 +231,10 @@ def main(
                 for row in in_reader:
                     out_writer.writerow([instance_path] + row)
 
+    # convert to the binary format, if requested
+    if binary:
+        borg.storage.RunData.from_bundle(bundle_path).to_binary_bundle(bundle_path)
+
 if __name__ == "__main__":
     borg.script(main)
 
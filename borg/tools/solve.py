@@ -52,6 +52,7 @@ def enable_output():
     budget = ("time limit (CPU or wall)", "option", None, float),
     cores = ("units of execution", "option", None, int),
     speed = ("machine calibration ratio", "option", "s", float),
+    compact = ("drop model components below this posterior mass", "option", None, float),
     quiet = ("be less noisy", "flag", "q"),
     )
 def main(
@@ -62,6 +63,7 @@ def main(
     budget = 3600.0,
     cores = 1,
     speed = borg.defaults.machine_speed,
+    compact = None,
     quiet = False
     ):
     """Solve a problem instance."""
@@ -86,6 +88,12 @@ def main(
         with open(model_path) as file:
             portfolio = pickle.load(file)
 
+        if compact is not None:
+            if not isinstance(portfolio, borg.portfolios.PureModelPortfolio):
+                raise Exception("compaction requires a model portfolio")
+
+            portfolio.compact(compact)
+
         logger.info("solving %s", input_path)
 
         with bundle.domain.task_from_path(input_path) as task:
@@ -14,7 +14,11 @@ else:
         Extension("borg.bregman", ["borg/bregman.pyx"]),
         Extension("borg.models", ["borg/models.pyx"]),
         Extension("borg.planners", ["borg/planners.pyx"]),
-        Extension("borg.statistics", ["borg/statistics.pyx"]),
+        Extension(
+            "borg.statistics",
+            ["borg/statistics.pyx"],
+            extra_compile_args = ["-fopenmp"],
+            extra_link_args = ["-fopenmp"]),
         Extension("borg.domains.max_sat.features", ["borg/domains/max_sat/features.pyx"]),
         Extension("borg.domains.max_sat.instance", ["borg/domains/max_sat/instance.pyx"]),
         Extension("borg.domains.pb.features", ["borg/domains/pb/features.pyx"]),